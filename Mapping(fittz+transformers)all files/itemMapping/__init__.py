@@ -0,0 +1,8 @@
+# itemMapping/__init__.py
+
+import os
+import sys
+
+# The modules shared with the other pipelines (sql_engine.py,
+# vector_index.py, result_writer.py) live at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
@@ -1,12 +1,9 @@
 # itemMapping/azureEmbedder.py
 
 from itemMapping.logger import logger
-from itemMapping.config import get_openai_client
+from itemMapping.config import get_client
 import os
 
-# Load Azure client once
-client = get_openai_client()
-
 # Azure deployment name for embeddings
 AZURE_EMBED_DEPLOYMENT = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
 
@@ -19,7 +16,7 @@ def get_embedding(text: str):
     try:
         logger.info(f"[EMB] Generating Azure embedding for text…")
 
-        resp = client.embeddings.create(
+        resp = get_client().embeddings.create(
             model=AZURE_EMBED_DEPLOYMENT,
             input=text
         )
@@ -29,3 +26,49 @@ def get_embedding(text: str):
     except Exception as e:
         logger.error(f"Embedding FAILED: {e}")
         return []
+
+
+# Azure accepts up to 2048 inputs per embeddings request
+EMBED_BATCH_SIZE = int(os.getenv("AZURE_OPENAI_EMBEDDING_BATCH_SIZE", "256"))
+
+
+def embed_chunk(chunk):
+    """One embeddings request for `chunk` → {text: embedding}. A failed
+    request is bisected, so only texts that fail on their own are lost."""
+    try:
+        resp = get_client().embeddings.create(
+            model=AZURE_EMBED_DEPLOYMENT,
+            input=chunk
+        )
+        return {chunk[d.index]: d.embedding for d in resp.data}
+
+    except Exception as e:
+        if len(chunk) == 1:
+            logger.error(f"Embedding FAILED for {chunk[0][:60]!r}: {e}")
+            return {}
+        logger.warning(f"Embedding batch FAILED ({len(chunk)} texts), splitting: {e}")
+        mid = len(chunk) // 2
+        return {**embed_chunk(chunk[:mid]), **embed_chunk(chunk[mid:])}
+
+
+def get_embeddings(texts):
+    """Embed a list of texts in deduped, chunked batch requests.
+
+    Returns one embedding per input text, in order. Empty texts and texts
+    that fail on their own get an empty list, like get_embedding().
+    """
+    unique = list(dict.fromkeys(t for t in texts if t and t.strip()))
+    vectors = {}
+
+    for start in range(0, len(unique), EMBED_BATCH_SIZE):
+        chunk = unique[start:start + EMBED_BATCH_SIZE]
+        logger.info(
+            f"[EMB] Generating Azure embeddings "
+            f"{start + len(chunk)}/{len(unique)}…"
+        )
+        vectors.update(embed_chunk(chunk))
+
+    if len(vectors) < len(unique):
+        logger.error(f"{len(unique) - len(vectors)}/{len(unique)} texts could not be embedded")
+
+    return [vectors.get(t, []) for t in texts]
@@ -1,10 +1,8 @@
 # db_loader.py
 from itemMapping.logger import logger
-from itemMapping.config import get_sql_engine
+from itemMapping.config import connect
 from sqlalchemy import text
 
-engine = get_sql_engine()
-
 
 def load_gate_group_items():
     """Load GateGroup items from SQL Server."""
@@ -40,7 +38,7 @@ GROUP BY
     """)
 
     try:
-        with engine.connect() as conn:
+        with connect() as conn:
             rows = conn.execute(sql).fetchall()
             logger.info(f"GateGroup items loaded: {len(rows)}")
             return rows
@@ -61,7 +59,7 @@ def load_competitor_items():
     """)
 
     try:
-        with engine.connect() as conn:
+        with connect() as conn:
             rows = conn.execute(sql).fetchall()
             logger.info(f"Competitor items loaded: {len(rows)}")
             return rows
@@ -1,15 +1,14 @@
 # embedder.py
 from itemMapping.logger import logger
-from itemMapping.config import get_openai_client
+from itemMapping.config import get_client
 import numpy as np
 
-client = get_openai_client()
 EMBED_MODEL = "text-embedding-3-large"
 
 def embed_text(text):
     try:
         logger.info(f"Embedding text: {text[:40]}...")
-        resp = client.embeddings.create(model=EMBED_MODEL, input=text)
+        resp = get_client().embeddings.create(model=EMBED_MODEL, input=text)
         logger.info("Embedding successful.")
         return resp.data[0].embedding
     except Exception as e:
@@ -18,6 +17,45 @@ def embed_text(text):
         return None
 
 
+# Azure accepts up to 2048 inputs per embeddings request
+EMBED_BATCH_SIZE = 256
+
+
+def embed_chunk(chunk):
+    """One embeddings request for `chunk` → {text: embedding}. A failed
+    request is bisected, so only texts that fail on their own are lost."""
+    try:
+        resp = get_client().embeddings.create(model=EMBED_MODEL, input=chunk)
+        return {chunk[d.index]: d.embedding for d in resp.data}
+    except Exception as e:
+        if len(chunk) == 1:
+            logger.error(f"Embedding FAILED for text: {chunk[0][:60]}")
+            logger.error(e)
+            return {}
+        logger.warning(f"Embedding batch FAILED ({len(chunk)} texts), splitting: {e}")
+        mid = len(chunk) // 2
+        return {**embed_chunk(chunk[:mid]), **embed_chunk(chunk[mid:])}
+
+
+def embed_texts(texts):
+    """Batch version of embed_text: deduped, chunked, results in input order.
+
+    Texts that fail on their own get None, like embed_text().
+    """
+    unique = list(dict.fromkeys(texts))
+    vectors = {}
+
+    for start in range(0, len(unique), EMBED_BATCH_SIZE):
+        chunk = unique[start:start + EMBED_BATCH_SIZE]
+        logger.info(f"Embedding batch {start + len(chunk)}/{len(unique)}...")
+        vectors.update(embed_chunk(chunk))
+
+    if len(vectors) < len(unique):
+        logger.error(f"{len(unique) - len(vectors)}/{len(unique)} texts could not be embedded")
+
+    return [vectors.get(t) for t in texts]
+
+
 def cosine(a, b):
     try:
         return float(np.dot(a, b) / (np.linalg.norm(a) * np.linalg.norm(b)))
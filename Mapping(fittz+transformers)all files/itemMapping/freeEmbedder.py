@@ -1,18 +1,84 @@
 # itemMapping/freeEmbedder.py
 
-from sentence_transformers import SentenceTransformer
+import os
+import numpy as np
+from itemMapping.config import shared
 
-print("[INFO] Loading FREE local embedding model (all-MiniLM-L6-v2)...")
+MODEL_NAME = "all-MiniLM-L6-v2"
 
-# Load model ONCE globally (fast)
-model = SentenceTransformer("all-MiniLM-L6-v2")
+# "torch" (default) or "onnx". The ONNX file can point at one of the
+# quantized int8 exports shipped with the model for faster CPU inference.
+BACKEND = os.getenv("FREE_EMBED_BACKEND", "torch")
+ONNX_FILE = os.getenv("FREE_EMBED_ONNX_FILE", "onnx/model_quint8_avx2.onnx")
+BATCH_SIZE = int(os.getenv("FREE_EMBED_BATCH_SIZE", "128"))
+# > 1 spreads encoding over that many CPU worker processes
+PROCESSES = int(os.getenv("FREE_EMBED_PROCESSES", "1"))
 
-print("[INFO] Free embedding model loaded successfully!")
+
+@shared
+def get_model():
+    """Load the model ONCE, on first use (importing torch alone takes seconds)."""
+    from sentence_transformers import SentenceTransformer
+
+    print(f"[INFO] Loading FREE local embedding model ({MODEL_NAME}, {BACKEND})...")
+
+    if BACKEND == "onnx":
+        model = SentenceTransformer(
+            MODEL_NAME, backend="onnx", model_kwargs={"file_name": ONNX_FILE}
+        )
+    else:
+        model = SentenceTransformer(MODEL_NAME)
+
+    print("[INFO] Free embedding model loaded successfully!")
+    return model
+
+
+def encode_texts(texts, batch_size=BATCH_SIZE, processes=PROCESSES):
+    """Encode a whole column of texts into a normalized float32 matrix.
+
+    Duplicate texts are encoded once; empty texts get a zero row.
+    """
+    model = get_model()
+    unique = list(dict.fromkeys(t for t in texts if t))
+    dim = model.get_sentence_embedding_dimension()
+
+    if not unique:
+        return np.zeros((len(texts), dim), dtype=np.float32)
+
+    if processes > 1:
+        pool = model.start_multi_process_pool(["cpu"] * processes)
+        try:
+            vectors = model.encode(
+                unique, pool=pool, batch_size=batch_size,
+                normalize_embeddings=True, convert_to_numpy=True
+            )
+        finally:
+            model.stop_multi_process_pool(pool)
+    else:
+        vectors = model.encode(
+            unique, batch_size=batch_size,
+            normalize_embeddings=True, convert_to_numpy=True
+        )
+
+    vectors = np.asarray(vectors, dtype=np.float32)
+    row_of = {t: i for i, t in enumerate(unique)}
+
+    out = np.zeros((len(texts), dim), dtype=np.float32)
+    for i, t in enumerate(texts):
+        if t:
+            out[i] = vectors[row_of[t]]
+    return out
+
+
+def get_embeddings(texts):
+    """List-of-lists wrapper around encode_texts (empty text → [])."""
+    matrix = encode_texts(texts)
+    return [row.tolist() if t else [] for t, row in zip(texts, matrix)]
 
 
 def get_embedding(text: str):
     """Generate a local embedding (Python list)."""
     if not text:
         return []
-    vector = model.encode(text)
-    return vector.tolist()
\ No newline at end of file
+    vector = get_model().encode(text)
+    return vector.tolist()
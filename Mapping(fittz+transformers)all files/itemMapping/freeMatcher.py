@@ -2,20 +2,23 @@
 
 from itemMapping.logger import logger
 from itemMapping.db_loader import load_gate_group_items, load_competitor_items
-# from itemMapping.freeEmbedder import get_embedding
-from itemMapping.azureEmbedder import get_embedding
-import math
+# from itemMapping.freeEmbedder import get_embeddings
+from itemMapping.azureEmbedder import get_embeddings
+import numpy as np
 
 
 # -------------------------------------------------------------------
 # COSINE SIMILARITY
 # -------------------------------------------------------------------
-def cosine(v1, v2):
-    """Compute cosine similarity between two vectors."""
-    dot = sum(a * b for a, b in zip(v1, v2))
-    norm1 = math.sqrt(sum(a * a for a in v1))
-    norm2 = math.sqrt(sum(b * b for b in v2))
-    return dot / (norm1 * norm2) if norm1 > 0 and norm2 > 0 else 0
+def unit_matrix(vectors, dim):
+    """Stack vectors into L2-normalized float32 rows, so a matrix product
+    gives cosine scores. Empty/zero vectors become zero rows (score 0)."""
+    mat = np.zeros((len(vectors), dim), dtype=np.float32)
+    for row, vec in enumerate(vectors):
+        if len(vec):
+            mat[row] = vec
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    return mat / np.where(norms > 0, norms, 1.0)
 
 
 # -------------------------------------------------------------------
@@ -58,47 +61,48 @@ def embed_all_items():
     comp_embeds = []
 
     # ---- GateGroup items ----
-    for idx, g in enumerate(gg_items, start=1):
-        name = g.item_onboard_name or ""
-        desc = g.item_description or ""
-
-        logger.info(f"[GG] Embedding {idx}/{len(gg_items)}: {name}")
-
+    for g in gg_items:
         gg_embeds.append({
             "id": g.item_row_id,
-            "name": name,
-            "desc": desc,
+            "name": g.item_onboard_name or "",
+            "desc": g.item_description or "",
             "price": parse_gate_price(g.item_price),
             "currency": g.item_currency_code,
-
-            # Separate embeddings for name + description
-            "embed_name": get_embedding(name),
-            "embed_desc": get_embedding(desc),
         })
 
     # ---- Competitor items ----
-    for idx, c in enumerate(comp_items, start=1):
+    for c in comp_items:
         brand = getattr(c, "Item_brand", "") or ""
         qty = getattr(c, "Item_Quantity", "") or ""
-        name = c.Item_name or ""
-        desc = c.Item_description or ""
-
-        logger.info(f"[COMP] Embedding {idx}/{len(comp_items)}: {name}")
 
         comp_embeds.append({
             "id": c.id,
             "brand": brand,
             "quantity": qty,
-            "name": name,
-            "desc": desc,
+            "name": c.Item_name or "",
+            "desc": c.Item_description or "",
             "price": safe_float(c.Item_price),
             "currency": c.Item_currency,
-
-            # Competitor name field = brand + name + qty
-            "embed_name": get_embedding(f"{brand} {name} {qty}".strip()),
-            "embed_desc": get_embedding(desc),
         })
 
+    # ---- Batched embeddings: separate name + description vectors ----
+    logger.info(f"[GG] Embedding {len(gg_embeds)} items...")
+    gg_names = get_embeddings([g["name"] for g in gg_embeds])
+    gg_descs = get_embeddings([g["desc"] for g in gg_embeds])
+    for g, name_vec, desc_vec in zip(gg_embeds, gg_names, gg_descs):
+        g["embed_name"] = name_vec
+        g["embed_desc"] = desc_vec
+
+    # Competitor name field = brand + name + qty
+    logger.info(f"[COMP] Embedding {len(comp_embeds)} items...")
+    comp_names = get_embeddings([
+        f"{c['brand']} {c['name']} {c['quantity']}".strip() for c in comp_embeds
+    ])
+    comp_descs = get_embeddings([c["desc"] for c in comp_embeds])
+    for c, name_vec, desc_vec in zip(comp_embeds, comp_names, comp_descs):
+        c["embed_name"] = name_vec
+        c["embed_desc"] = desc_vec
+
     return gg_embeds, comp_embeds
 
 
@@ -106,49 +110,59 @@ def embed_all_items():
 # MATCHING PIPELINE
 # -------------------------------------------------------------------
 def match_items_free():
+    return list(iter_match_items_free())
+
+
+def iter_match_items_free():
+    """Yield one result block per matched GG item as soon as it is scored."""
     logger.info("Starting weighted cosine similarity matching...")
 
     gg_embeds, comp_embeds = embed_all_items()
-    results = []
 
     NAME_WEIGHT = 0.90
     DESC_WEIGHT = 0.10
     SIM_THRESHOLD = 0.70
 
+    vectors = [item[f] for item in gg_embeds + comp_embeds for f in ("embed_name", "embed_desc")]
+    dim = next((len(v) for v in vectors if len(v)), 0)
+    if not gg_embeds or not comp_embeds or not dim:
+        return
+
+    # Weighted similarity of every GG x competitor pair, one matmul per field
+    name_scores = (unit_matrix([g["embed_name"] for g in gg_embeds], dim)
+                   @ unit_matrix([c["embed_name"] for c in comp_embeds], dim).T)
+    desc_scores = (unit_matrix([g["embed_desc"] for g in gg_embeds], dim)
+                   @ unit_matrix([c["embed_desc"] for c in comp_embeds], dim).T)
+    final_scores = NAME_WEIGHT * name_scores + DESC_WEIGHT * desc_scores
+
     for idx, gg in enumerate(gg_embeds, start=1):
         logger.info(f"[MATCH] {idx}/{len(gg_embeds)} → {gg['name']}")
 
         matches = []
 
-        for comp in comp_embeds:
-
-            # Compute weighted similarity
-            sim_name = cosine(gg["embed_name"], comp["embed_name"])
-            sim_desc = cosine(gg["embed_desc"], comp["embed_desc"])
-
-            final_similarity = (
-                (NAME_WEIGHT * sim_name) +
-                (DESC_WEIGHT * sim_desc)
-            )
-
-            if final_similarity >= SIM_THRESHOLD:
-                matches.append({
-                    "competitor_item_id": comp["id"],
-                    "competitor_item_name": comp["name"],
-                    "brand": comp["brand"],
-                    "quantity": comp["quantity"],
-                    "competitor_description": comp["desc"],
-                    "competitor_price": comp["price"],
-                    "competitor_currency": comp["currency"],
-                    "similarity_name": round(sim_name, 4),
-                    "similarity_desc": round(sim_desc, 4),
-                    "similarity_final": round(final_similarity, 4),
-                })
+        for ci in np.flatnonzero(final_scores[idx - 1] >= SIM_THRESHOLD).tolist():
+            comp = comp_embeds[ci]
+            sim_name = float(name_scores[idx - 1, ci])
+            sim_desc = float(desc_scores[idx - 1, ci])
+            final_similarity = float(final_scores[idx - 1, ci])
+
+            matches.append({
+                "competitor_item_id": comp["id"],
+                "competitor_item_name": comp["name"],
+                "brand": comp["brand"],
+                "quantity": comp["quantity"],
+                "competitor_description": comp["desc"],
+                "competitor_price": comp["price"],
+                "competitor_currency": comp["currency"],
+                "similarity_name": round(sim_name, 4),
+                "similarity_desc": round(sim_desc, 4),
+                "similarity_final": round(final_similarity, 4),
+            })
 
         matches = sorted(matches, key=lambda x: x["similarity_final"], reverse=True)
 
         if matches:
-            results.append({
+            yield {
                 "gate_item": {
                     "id": gg["id"],
                     "name": gg["name"],
@@ -157,7 +171,6 @@ def match_items_free():
                     "currency": gg["currency"],
                 },
                 "matches": matches
-            })
+            }
 
     logger.info("Matching completed with weighted similarity.")
-    return results
@@ -2,19 +2,8 @@
 
 from itemMapping.logger import logger
 from itemMapping.db_loader import load_gate_group_items, load_competitor_items
-from itemMapping.freeEmbedder import get_embedding
-import math
-
-
-# -------------------------------------------------------------------
-# COSINE SIMILARITY
-# -------------------------------------------------------------------
-def cosine(v1, v2):
-    """Compute cosine similarity between two vectors."""
-    dot = sum(a * b for a, b in zip(v1, v2))
-    norm1 = math.sqrt(sum(a * a for a in v1))
-    norm2 = math.sqrt(sum(b * b for b in v2))
-    return dot / (norm1 * norm2) if norm1 > 0 and norm2 > 0 else 0
+from itemMapping.freeEmbedder import encode_texts
+import numpy as np
 
 
 # -------------------------------------------------------------------
@@ -57,7 +46,11 @@ def safe_float(value):
 # EMBEDDING PIPELINE
 # -------------------------------------------------------------------
 def embed_all_items():
-    """Embed all Gategroup + competitor items using local model."""
+    """Embed all Gategroup + competitor items using local model.
+
+    Returns the item dicts plus one normalized float32 matrix per side
+    (row i = item i), encoded in bulk.
+    """
 
     logger.info("Embedding items (FREE mode)...")
 
@@ -66,31 +59,26 @@ def embed_all_items():
 
     gg_embeds = []
     comp_embeds = []
+    gg_texts = []
+    comp_texts = []
 
     # ---- GateGroup items ----
-    for idx, g in enumerate(gg_items, start=1):
-        logger.info(f"[GG] Embedding {idx}/{len(gg_items)}: {g.item_onboard_name}")
-
+    for g in gg_items:
         # EMBEDDING TEXT = name + description
         name = g.item_onboard_name or ""
         desc = g.item_description or ""
 
-        full_text = f"{name} {desc}".strip()
-        vec = get_embedding(full_text)
-
+        gg_texts.append(f"{name} {desc}".strip())
         gg_embeds.append({
             "id": g.item_row_id,
             "name": name,
             "desc": desc,
             "price": parse_gate_price(g.item_price),
             "currency": g.item_currency_code,
-            "embed": vec
         })
 
     # ---- Competitor items ----
-    for idx, c in enumerate(comp_items, start=1):
-        logger.info(f"[COMP] Embedding {idx}/{len(comp_items)}: {c.Item_name}")
-
+    for c in comp_items:
         # Extract fields with safe defaults
         brand = getattr(c, "Item_brand", "") or ""
         qty = getattr(c, "Item_Quantity", "") or ""
@@ -98,10 +86,7 @@ def embed_all_items():
         desc = c.Item_description or ""
 
         # EMBEDDING TEXT = brand + name + quantity + description
-        full_text = f"{brand} {name} {qty} {desc}".strip()
-
-        vec = get_embedding(full_text)
-
+        comp_texts.append(f"{brand} {name} {qty} {desc}".strip())
         comp_embeds.append({
             "id": c.id,
             "brand": brand,
@@ -110,10 +95,15 @@ def embed_all_items():
             "desc": desc,
             "price": safe_float(c.Item_price),
             "currency": c.Item_currency,
-            "embed": vec
         })
 
-    return gg_embeds, comp_embeds
+    logger.info(f"[GG] Encoding {len(gg_texts)} items...")
+    gg_matrix = encode_texts(gg_texts)
+
+    logger.info(f"[COMP] Encoding {len(comp_texts)} items...")
+    comp_matrix = encode_texts(comp_texts)
+
+    return gg_embeds, comp_embeds, gg_matrix, comp_matrix
 
 
 # -------------------------------------------------------------------
@@ -123,34 +113,35 @@ def match_items_free():
     """Match Gategroup items → competitor items using cosine similarity."""
     logger.info("Starting FREE item matching...")
 
-    gg_embeds, comp_embeds = embed_all_items()
+    gg_embeds, comp_embeds, gg_matrix, comp_matrix = embed_all_items()
     results = []
 
     SIM_THRESHOLD = 0.70  # Only return matches ≥ 70%
 
+    # Rows are normalized, so one matrix product gives every cosine score
+    scores = gg_matrix @ comp_matrix.T
+
     # Loop GateGroup FIRST (primary catalogue)
     for idx, gg in enumerate(gg_embeds, start=1):
-        logger.info(f"[MATCH] {idx}/{len(gg_embeds)} → {gg['name']}")
-
-        matches = []
-
-        for comp in comp_embeds:
-            score = cosine(gg["embed"], comp["embed"])
-
-            if score >= SIM_THRESHOLD:
-                matches.append({
-                    "competitor_item_id": comp["id"],
-                    "brand": comp["brand"],
-                    "quantity": comp["quantity"],
-                    "competitor_item_name": comp["name"],
-                    "competitor_description": comp["desc"],
-                    "competitor_price": comp["price"],
-                    "competitor_currency": comp["currency"],
-                    "similarity": round(score, 4)
-                })
+        row = scores[idx - 1]
+        hits = np.flatnonzero(row >= SIM_THRESHOLD)
 
         # Sort by similarity DESC
-        matches = sorted(matches, key=lambda x: x["similarity"], reverse=True)
+        hits = hits[np.argsort(-row[hits], kind="stable")]
+
+        matches = []
+        for ci in hits.tolist():
+            comp = comp_embeds[ci]
+            matches.append({
+                "competitor_item_id": comp["id"],
+                "brand": comp["brand"],
+                "quantity": comp["quantity"],
+                "competitor_item_name": comp["name"],
+                "competitor_description": comp["desc"],
+                "competitor_price": comp["price"],
+                "competitor_currency": comp["currency"],
+                "similarity": round(float(row[ci]), 4)
+            })
 
         if matches:
             results.append({
@@ -1,9 +1,10 @@
 # main.py
-import json
+import sys
 import time
 import decimal
 from itemMapping.logger import logger
-from itemMapping.freeMatcher import match_items_free as match_items
+from itemMapping.freeMatcher import iter_match_items_free as match_items
+from result_writer import ResultWriter, result_path, RESULT_FORMAT, RESULT_COMPACT
 # from itemMapping.matcher import match_items(for PAID mode)azure
 
 
@@ -19,16 +20,16 @@ if __name__ == "__main__":
     logger.info("🚀 Starting mapping pipeline...")
 
     try:
-        # Run the full matching process
-        result = match_items()
+        # --jsonl: one block per line, --compact: no indentation
+        fmt = "jsonl" if "--jsonl" in sys.argv else RESULT_FORMAT
+        output_path = result_path("price_comparison_matches", fmt)
 
-        # Save JSON output
-        with open("price_comparison_matches.json", "w", encoding="utf-8") as f:
-            json.dump(
-                result, f, indent=2, ensure_ascii=False, default=convert_decimal
-            )
+        # Run the matching process, streaming each block to disk as it is made
+        with ResultWriter(output_path, fmt, "--compact" in sys.argv or RESULT_COMPACT,
+                          default=convert_decimal) as writer:
+            writer.write_all(match_items())
 
-        logger.info("💾 Output saved → price_comparison_matches.json")
+        logger.info(f"💾 Output saved → {output_path}")
 
     except Exception as e:
         logger.error("❌ Pipeline FAILED")
@@ -1,7 +1,15 @@
 # matcher.py
 from itemMapping.logger import logger
-from itemMapping.embedder import embed_text, cosine
+from itemMapping.embedder import embed_texts
 from itemMapping.db_loader import load_gate_group_items, load_competitor_items
+from vector_index import build_index
+import numpy as np
+import os
+
+# Vector index used for top-k retrieval: "flat" (exact; "all", the
+# itemMappingAzure default, is the same here), "ivf" or "hnsw"
+INDEX_TYPE = os.getenv("MATCH_INDEX_TYPE", "flat")
+TOP_K = 5
 
 def embed_all_items():
     logger.info("Embedding GateGroup + Competitor items...")
@@ -12,9 +20,9 @@ def embed_all_items():
     gg_embeds = []
     comp_embeds = []
 
-    for idx, g in enumerate(gg_items, start=1):
-        logger.info(f"[GG] Embedding {idx}/{len(gg_items)}: {g.item_name}")
-        vec = embed_text(f"{g.item_name} - {g.item_description}")
+    logger.info(f"[GG] Embedding {len(gg_items)} items...")
+    gg_vecs = embed_texts([f"{g.item_name} - {g.item_description}" for g in gg_items])
+    for g, vec in zip(gg_items, gg_vecs):
         if vec:
             gg_embeds.append({
                 "id": g.item_row_id,
@@ -25,9 +33,9 @@ def embed_all_items():
                 "embed": vec
             })
 
-    for idx, c in enumerate(comp_items, start=1):
-        logger.info(f"[COMP] Embedding {idx}/{len(comp_items)}: {c.Item_name}")
-        vec = embed_text(f"{c.Item_name} - {c.Item_description}")
+    logger.info(f"[COMP] Embedding {len(comp_items)} items...")
+    comp_vecs = embed_texts([f"{c.Item_name} - {c.Item_description}" for c in comp_items])
+    for c, vec in zip(comp_items, comp_vecs):
         if vec:
             comp_embeds.append({
                 "id": c.id,
@@ -41,19 +49,36 @@ def embed_all_items():
     return gg_embeds, comp_embeds
 
 
+def normalized_matrix(embeds):
+    mat = np.asarray([e["embed"] for e in embeds], dtype=np.float32)
+    norms = np.linalg.norm(mat, axis=1, keepdims=True)
+    return mat / np.where(norms > 0, norms, 1.0)
+
+
 def match_items():
     logger.info("Starting item matching...")
 
     gg_embeds, comp_embeds = embed_all_items()
     results = []
 
+    if not gg_embeds or not comp_embeds:
+        logger.info("Matching completed.")
+        return results
+
+    # Index GG items once and fetch the top-k per competitor item instead of
+    # scoring every pair.
+    index = build_index(INDEX_TYPE, normalized_matrix(gg_embeds))
+    scores, ids = index.search(normalized_matrix(comp_embeds), TOP_K)
+
     for idx, comp in enumerate(comp_embeds, start=1):
         logger.info(f"[MATCH] {idx}/{len(comp_embeds)} → {comp['name']}")
-        sims = []
 
-        for gg in gg_embeds:
-            score = cosine(comp["embed"], gg["embed"])
-            sims.append({
+        top5 = []
+        for score, gi in zip(scores[idx - 1].tolist(), ids[idx - 1].tolist()):
+            if gi < 0:
+                continue
+            gg = gg_embeds[gi]
+            top5.append({
                 "gate_item_id": gg["id"],
                 "gate_item_name": gg["name"],
                 "gate_item_description": gg["desc"],
@@ -62,11 +87,10 @@ def match_items():
                 "similarity": score
             })
 
-        top5 = sorted(sims, key=lambda x: x["similarity"], reverse=True)[:5]
         results.append({
             "competitor_item": comp,
             "matches": top5
         })
 
     logger.info("Matching completed.")
-    return results
\ No newline at end of file
+    return results
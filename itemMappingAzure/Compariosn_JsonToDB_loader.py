@@ -1,30 +1,20 @@
-import json
 import os
-from sqlalchemy import create_engine, text
-from dotenv import load_dotenv
+import sys
+from sqlalchemy import text
 
-load_dotenv()
-
-# ---------------------------------------------------------
-# SQL CONNECTION
-# ---------------------------------------------------------
-server = os.getenv("AZURE_SQL_SERVER")
-database = os.getenv("AZURE_SQL_DATABASE")
-username = os.getenv("AZURE_SQL_USERNAME")
-password = os.getenv("AZURE_SQL_PASSWORD")
-
-connection_string = f"mssql+pymssql://{username}:{password}@{server}/{database}"
-engine = create_engine(connection_string)
+# Shared pooled engine (driver, pool sizing, pre-ping: see config.py).
+# Run from the repo root: python -m itemMappingAzure.Compariosn_JsonToDB_loader
+from itemMappingAzure.config import begin, pool_metrics, merge_rows, delete_keys
+from result_writer import iter_results
 
 # Folder containing final matching output JSONs
 MATCH_FOLDER = os.path.join(os.path.dirname(__file__), "../JsonOutput_Ryan_jet2_eurowings")
 
-json_files = [
-    f for f in os.listdir(MATCH_FOLDER)
-    if f.lower().endswith(".json")
-]
+TARGET_TABLE = "dbo.competitor_price_comparison"
 
-print(f"📁 Found {len(json_files)} match JSON files.\n")
+# "upsert" (default): MERGE through a temp table, re-runs never duplicate.
+# "insert": the old blind INSERT of every row.
+LOAD_MODE = os.getenv("COMPARISON_LOAD_MODE", "upsert")
 
 # ---------------------------------------------------------
 # SQL INSERT (updated to match FINAL TABLE DDL)
@@ -84,60 +74,134 @@ VALUES (
 )
 """)
 
+COLUMNS = [
+    "gate_item_row_id",
+    "gate_item_name",
+    "competitor_item_id",
+    "competitor_name",
+    "competitor_item_name",
+    "gate_item_description",
+    "gate_parent_category",
+    "gate_sales_category",
+    "competitor_item_description",
+    "competitor_parent_category",
+    "competitor_sales_category",
+    "competitor_item_price",
+    "competitor_item_currency",
+    "competitor_item_brand",
+    "competitor_item_quantity",
+    "competitor_catalog_name",
+    "competitor_catalog_start",
+    "competitor_catalog_end",
+    "competitor_catalog_page",
+    "similarity_name",
+    "similarity_description",
+    "similarity_parent_category",
+    "similarity_sales_category",
+    "similarity_final_score",
+]
+
+
+# ---------------------------------------------------------
+# ROW MAPPING
+# ---------------------------------------------------------
+def build_rows(blocks):
+    """Flatten matcher output blocks into one table row per match."""
+    for block in blocks:
+
+        gg = block["gate_item"]
+
+        for m in block["matches"]:
+
+            yield {
+                "gate_item_row_id": gg["id"],
+                "gate_item_name": gg["name"],
+                "gate_item_description": gg["desc"],
+                "gate_parent_category": gg["parent_category"],
+                "gate_sales_category": gg["sales_category"],
+
+                "competitor_item_id": m["competitor_item_id"],
+                "competitor_item_name": m["competitor_item_name"],
+                "competitor_item_brand": m.get("brand"),
+                "competitor_item_quantity": m.get("quantity"),
+                "competitor_item_description": m.get("competitor_description"),
+                "competitor_parent_category": m.get("parent_category"),
+                "competitor_sales_category": m.get("sales_category"),
+
+                # NEW FIELDS (price + currency)
+                "competitor_item_price": m.get("price"),
+                "competitor_item_currency": m.get("currency"),
+
+                # Catalog metadata
+                "competitor_name": m.get("competitor_name"),
+                "competitor_catalog_name": m.get("catalog_name"),
+                "competitor_catalog_start": m.get("catalog_start"),
+                "competitor_catalog_end": m.get("catalog_end"),
+                "competitor_catalog_page": m.get("competitor_page"),
+
+                # Similarity scores
+                "similarity_name": m["similarity_name"],
+                "similarity_description": m["similarity_desc"],
+                "similarity_parent_category": m["similarity_parent"],
+                "similarity_sales_category": m["similarity_sales"],
+                "similarity_final_score": m["similarity_final"]
+            }
+
+
+# ---------------------------------------------------------
+# LOADING (set-based MERGE: see sql_engine.py)
+# ---------------------------------------------------------
+def upsert_rows(conn, rows):
+    """MERGE rows into TARGET_TABLE. Returns (inserted, updated)."""
+    return merge_rows(conn, TARGET_TABLE, COLUMNS, rows)
+
+
+def delete_rows(conn, keys):
+    """Delete retracted matches, given as sql_engine.match_key() tuples."""
+    return delete_keys(conn, TARGET_TABLE, keys)
+
+
+def insert_rows(conn, rows):
+    if rows:
+        conn.execute(insert_sql, rows)
+    return len(rows), 0
+
+
 # ---------------------------------------------------------
 # PROCESS FILES
 # ---------------------------------------------------------
-total_inserted = 0
-
-for jf in json_files:
-    print(f"➡ Processing {jf}")
-    path = os.path.join(MATCH_FOLDER, jf)
-
-    with open(path, "r", encoding="utf-8") as f:
-        blocks = json.load(f)
-
-    with engine.begin() as conn:
-        for block in blocks:
-
-            gg = block["gate_item"]
-
-            for m in block["matches"]:
-
-                row = {
-                    "gate_item_row_id": gg["id"],
-                    "gate_item_name": gg["name"],
-                    "gate_item_description": gg["desc"],
-                    "gate_parent_category": gg["parent_category"],
-                    "gate_sales_category": gg["sales_category"],
-
-                    "competitor_item_id": m["competitor_item_id"],
-                    "competitor_item_name": m["competitor_item_name"],
-                    "competitor_item_brand": m.get("brand"),
-                    "competitor_item_quantity": m.get("quantity"),
-                    "competitor_item_description": m.get("competitor_description"),
-                    "competitor_parent_category": m.get("parent_category"),
-                    "competitor_sales_category": m.get("sales_category"),
-
-                    # NEW FIELDS (price + currency)
-                    "competitor_item_price": m.get("price"),
-                    "competitor_item_currency": m.get("currency"),
-
-                    # Catalog metadata
-                    "competitor_name": m.get("competitor_name"),
-                    "competitor_catalog_name": m.get("catalog_name"),
-                    "competitor_catalog_start": m.get("catalog_start"),
-                    "competitor_catalog_end": m.get("catalog_end"),
-                    "competitor_catalog_page": m.get("competitor_page"),
-
-                    # Similarity scores
-                    "similarity_name": m["similarity_name"],
-                    "similarity_description": m["similarity_desc"],
-                    "similarity_parent_category": m["similarity_parent"],
-                    "similarity_sales_category": m["similarity_sales"],
-                    "similarity_final_score": m["similarity_final"]
-                }
-
-                conn.execute(insert_sql, row)
-                total_inserted += 1
-
-print(f"\n✅ Total Rows Inserted: {total_inserted}")
+def load_file(path, mode=LOAD_MODE):
+    # .json arrays or .jsonl files (one result block per line)
+    rows = list(build_rows(iter_results(path)))
+
+    with begin() as conn:
+        if mode == "insert":
+            return insert_rows(conn, rows)
+        return upsert_rows(conn, rows)
+
+
+def main(mode=LOAD_MODE):
+    json_files = [
+        f for f in os.listdir(MATCH_FOLDER)
+        if f.lower().endswith((".json", ".jsonl"))
+    ]
+
+    print(f"📁 Found {len(json_files)} match JSON files ({mode} mode).\n")
+
+    total_inserted = 0
+    total_updated = 0
+
+    for jf in json_files:
+        print(f"➡ Processing {jf}")
+        inserted, updated = load_file(os.path.join(MATCH_FOLDER, jf), mode)
+        print(f"   ✔ Inserted: {inserted} | Updated: {updated}")
+
+        total_inserted += inserted
+        total_updated += updated
+
+    print(f"\n✅ Total Rows Inserted: {total_inserted} | Updated: {total_updated}")
+    print(f"🔌 SQL pool: {pool_metrics.summary()}")
+
+
+if __name__ == "__main__":
+    main("insert" if "--insert" in sys.argv else LOAD_MODE)
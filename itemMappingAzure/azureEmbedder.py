@@ -1,44 +1,34 @@
 # itemMappingAzure/azureEmbedder.py
 
 import os
-import json
 import math
+import hashlib
 from itemMappingAzure.logger import logger
-from itemMappingAzure.config import get_openai_client
+from itemMappingAzure.embeddingStore import EmbeddingStore
+from itemMappingAzure.config import get_client, shared
 
 # ---------------------------------------------------------
-# CACHE FILES
+# EMBEDDING CLIENT (created on first use, see config.get_client)
 # ---------------------------------------------------------
-GG_CACHE_FILE = "gg_embeddings.json"
-COMP_CACHE_FILE = "comp_embeddings.json"
-
-
-def load_cache(file_path):
-    if os.path.exists(file_path):
-        with open(file_path, "r", encoding="utf-8") as f:
-            return json.load(f)
-    return {}
-
+MODEL = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
 
-gg_cache = load_cache(GG_CACHE_FILE)
-comp_cache = load_cache(COMP_CACHE_FILE)
 
+# ---------------------------------------------------------
+# CACHE (content-addressed: hash of deployment + enriched text)
+# ---------------------------------------------------------
+CACHE_FILE = "embedding_cache"
 
-def save_gg_cache():
-    with open(GG_CACHE_FILE, "w", encoding="utf-8") as f:
-        json.dump(gg_cache, f, indent=2)
+# Opened on first use; loading the key index is not free for big caches
+get_cache = shared(lambda: EmbeddingStore(CACHE_FILE))
+CACHE_STATS = {"hits": 0, "misses": 0}
 
 
-def save_comp_cache():
-    with open(COMP_CACHE_FILE, "w", encoding="utf-8") as f:
-        json.dump(comp_cache, f, indent=2)
+def cache_key(text: str) -> str:
+    return hashlib.sha256(f"{MODEL}\0{text}".encode("utf-8")).hexdigest()
 
 
-# ---------------------------------------------------------
-# INIT EMBEDDING CLIENT
-# ---------------------------------------------------------
-client = get_openai_client()
-MODEL = os.getenv("AZURE_OPENAI_EMBEDDING_DEPLOYMENT")
+def flush_caches():
+    get_cache().flush()
 
 
 # ---------------------------------------------------------
@@ -50,31 +40,73 @@ def normalize(vec):
 
 
 # ---------------------------------------------------------
-# EMBEDDING CREATOR (cached)
+# EMBEDDING CREATOR (cached, batched)
 # ---------------------------------------------------------
-def get_embedding(text: str, key: str, cache_type: str):
-    cache = gg_cache if cache_type == "gg" else comp_cache
-    save_fn = save_gg_cache if cache_type == "gg" else save_comp_cache
+# Azure accepts up to 2048 inputs per embeddings request
+BATCH_SIZE = int(os.getenv("AZURE_OPENAI_EMBEDDING_BATCH_SIZE", "256"))
 
-    if key in cache:
-        return cache[key]
 
-    try:
-        logger.info(f"[EMBED] Generating embedding: {key}")
+def embed_batch(texts):
+    """One embeddings request for a chunk of texts; returns vectors in order."""
+    resp = get_client().embeddings.create(model=MODEL, input=texts)
+    ordered = sorted(resp.data, key=lambda d: d.index)
+    return [normalize(d.embedding) for d in ordered]
 
-        resp = client.embeddings.create(
-            model=MODEL,
-            input=text
+
+def embed_chunk(texts):
+    """embed_batch, bisecting a failed request so that only texts which
+    fail on their own (e.g. too long) are lost; [] marks those."""
+    try:
+        return embed_batch(texts)
+    except Exception as e:
+        if len(texts) == 1:
+            logger.error(f"❌ Embedding failed for {texts[0][:60]!r}: {e}")
+            return [[]]
+        logger.warning(f"Embedding batch failed ({len(texts)} texts), splitting it: {e}")
+        mid = len(texts) // 2
+        return embed_chunk(texts[:mid]) + embed_chunk(texts[mid:])
+
+
+def get_embeddings(texts):
+    """Embed a list of texts, deduped and served from the cache where possible.
+
+    Returns one vector per input text (in input order); texts that fail on
+    their own get an empty list (and are not cached).
+    """
+    cache = get_cache()
+    keys = [cache_key(t) for t in texts]
+
+    missing = {}
+    for key, text in zip(keys, texts):
+        if key not in cache and key not in missing:
+            missing[key] = text
+
+    CACHE_STATS["misses"] += len(missing)
+    CACHE_STATS["hits"] += len(texts) - len(missing)
+
+    pending = list(missing.items())
+    failed = 0
+    for start in range(0, len(pending), BATCH_SIZE):
+        chunk = pending[start:start + BATCH_SIZE]
+        logger.info(
+            f"[EMBED] Generating {len(chunk)} embeddings "
+            f"({start + len(chunk)}/{len(pending)})"
         )
+        vectors = embed_chunk([text for _, text in chunk])
+        for (key, _), emb in zip(chunk, vectors):
+            if len(emb):
+                cache.put(key, emb)
+            else:
+                failed += 1
 
-        emb = normalize(resp.data[0].embedding)
-        cache[key] = emb
-        save_fn()
-        return emb
+    if failed:
+        logger.error(f"❌ {failed}/{len(pending)} texts could not be embedded (retried next run)")
 
-    except Exception as e:
-        logger.error(f"❌ Embedding failed for {key}: {e}")
-        return []
+    return [cache.get(key) if key in cache else [] for key in keys]
+
+
+def get_embedding(text: str):
+    return get_embeddings([text])[0]
 
 
 # ---------------------------------------------------------
@@ -1,15 +1,23 @@
 # config.py
 from itemMappingAzure.logger import logger
 import os
-from sqlalchemy import create_engine, text
 from dotenv import load_dotenv
-from openai import AzureOpenAI
 
 load_dotenv()
 
+# Engine, pool metrics and connection helpers are shared by every
+# pipeline (sql_engine.py at the repository root)
+from sql_engine import (
+    SQL_DRIVER, STREAM_BATCH_SIZE, OFFLINE_SQLITE, pool_metrics,
+    get_engine, shared, connect, begin, stream_rows, merge_rows, delete_keys,
+)
+
 
 def get_openai_client():
     """Return Azure OpenAI client."""
+    # Imported here: the openai package alone costs noticeable startup time
+    from openai import AzureOpenAI
+
     try:
         logger.info("Initializing Azure OpenAI client...")
         client = AzureOpenAI(
@@ -24,27 +32,4 @@ def get_openai_client():
         raise
 
 
-def get_sql_engine():
-    """Return SQLAlchemy engine (Azure SQL + pymssql)."""
-    try:
-        logger.info("Connecting to Azure SQL...")
-
-        server = os.getenv("AZURE_SQL_SERVER")
-        database = os.getenv("AZURE_SQL_DATABASE")
-        username = os.getenv("AZURE_SQL_USERNAME")
-        password = os.getenv("AZURE_SQL_PASSWORD")
-
-        conn_str = f"mssql+pymssql://{username}:{password}@{server}/{database}"
-        engine = create_engine(conn_str)
-
-        # IMPORTANT: wrap SQL in text()
-        with engine.connect() as conn:
-            conn.execute(text("SELECT 1"))
-
-        logger.info("Connected to Azure SQL successfully.")
-        return engine
-
-    except Exception as e:
-        logger.error("Azure SQL connection FAILED!")
-        logger.error(e, exc_info=True)
-        raise
\ No newline at end of file
+get_client = shared(get_openai_client)
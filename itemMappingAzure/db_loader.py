@@ -1,18 +1,77 @@
 # itemMappingAzure/db_loader.py
 
+import os
 from itemMappingAzure.logger import logger
-from itemMappingAzure.config import get_sql_engine
+from itemMappingAzure.config import stream_rows, STREAM_BATCH_SIZE
 from sqlalchemy import text
+from itertools import islice
+
+# "sql" (Azure SQL) or "snapshot" (Arrow snapshot, see snapshot.py)
+DATA_SOURCE = os.getenv("MATCH_DATA_SOURCE", "sql")
 
-engine = get_sql_engine()
 
 # ---------------------------------------------------------
-# LOAD GATE GROUP ITEMS  (UPDATED SQL)
+# COMPACT ROW RECORDS
 # ---------------------------------------------------------
-def load_gate_group_items():
-    logger.info("Loading GateGroup items...")
+class Record:
+    """Fixed-attribute row copy (__slots__: no per-row dict, no Row object).
+    Built from a SQLAlchemy Row or a plain dict (snapshot rows)."""
+    __slots__ = ()
+
+    def __init__(self, row):
+        mapping = getattr(row, "_mapping", row)
+        for name in self.__slots__:
+            setattr(self, name, mapping.get(name))
+
+
+class GateItem(Record):
+    __slots__ = (
+        "item_row_id", "item_onboard_name", "item_description",
+        "item_parent_sales_category_name", "item_sales_category_name",
+    )
+
+
+class CompetitorItem(Record):
+    __slots__ = (
+        "item_id", "competitor_name", "item_name", "Item_description", "brand",
+        "quantity", "parent_category", "sales_category", "price", "currency",
+        "catalog_name", "catalog_start", "catalog_end", "page", "created_at",
+    )
+
+
+def stream_records(sql, record_type, chunk_size=STREAM_BATCH_SIZE):
+    """Yield lists of `record_type`, one chunk at a time, while the query
+    is still being fetched through a server-side cursor."""
+    rows = (record_type(r) for r in stream_rows(sql, batch_size=chunk_size))
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def snapshot_records(table_name, record_type, chunk_size=STREAM_BATCH_SIZE, version=None):
+    """stream_records() over an Arrow snapshot instead of Azure SQL."""
+    # Imported here: pyarrow is optional and only needed for snapshot runs
+    from itemMappingAzure import snapshot
+
+    version = version or snapshot.SNAPSHOT_VERSION
+    table = (snapshot.gate_group_table(version) if table_name == "gate_group_items"
+             else snapshot.competitor_table(version))
+    for rows in snapshot.iter_rows(table, record_type.__slots__, chunk_size):
+        yield [record_type(r) for r in rows]
+
+
+def records(sql, table_name, record_type, chunk_size, source, version):
+    if (source or DATA_SOURCE) == "snapshot":
+        return snapshot_records(table_name, record_type, chunk_size, version)
+    return stream_records(sql, record_type, chunk_size)
 
-    sql = text("""
+
+# ---------------------------------------------------------
+# LOAD GATE GROUP ITEMS  (UPDATED SQL)
+# ---------------------------------------------------------
+GATE_GROUP_SQL = text("""
         SELECT 
             i.item_row_id,
             i.item_onboard_name,
@@ -31,18 +90,21 @@ def load_gate_group_items():
             i.item_sales_category_name;
     """)
 
-    with engine.connect() as conn:
-        rows = conn.execute(sql).fetchall()
-        return rows
+
+def iter_gate_group_items(chunk_size=STREAM_BATCH_SIZE, source=None, version=None):
+    logger.info("Streaming GateGroup items...")
+    return records(GATE_GROUP_SQL, "gate_group_items", GateItem, chunk_size, source, version)
+
+
+def load_gate_group_items(source=None, version=None):
+    logger.info("Loading GateGroup items...")
+    return [g for chunk in iter_gate_group_items(STREAM_BATCH_SIZE, source, version) for g in chunk]
 
 
 # ---------------------------------------------------------
 # LOAD COMPETITOR ITEMS (UPDATED SQL)
 # ---------------------------------------------------------
-def load_competitor_items():
-    logger.info("Loading competitor items...")
-
-    sql = text("""
+COMPETITOR_SQL = text("""
         SELECT 
             item_id,
             competitor_name,
@@ -62,6 +124,12 @@ def load_competitor_items():
         FROM competitor_item_details;
     """)
 
-    with engine.connect() as conn:
-        rows = conn.execute(sql).fetchall()
-        return rows
+
+def iter_competitor_items(chunk_size=STREAM_BATCH_SIZE, source=None, version=None):
+    logger.info("Streaming competitor items...")
+    return records(COMPETITOR_SQL, "competitor_items", CompetitorItem, chunk_size, source, version)
+
+
+def load_competitor_items(source=None, version=None):
+    logger.info("Loading competitor items...")
+    return [c for chunk in iter_competitor_items(STREAM_BATCH_SIZE, source, version) for c in chunk]
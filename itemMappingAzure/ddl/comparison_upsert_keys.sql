@@ -0,0 +1,28 @@
+-- One-off migration for the MERGE in Compariosn_JsonToDB_loader.py
+-- (set-based upsert: see sql_engine.py).
+--
+-- 1. competitor_catalog_key: a persisted ISNULL(competitor_catalog_name, '')
+--    column, so rows without a catalog still have a comparable key. The MERGE
+--    joins on it (t.competitor_catalog_key = ISNULL(s.competitor_catalog_name, ''))
+--    instead of a NULL-safe OR, which the index could not serve.
+-- 2. Remove duplicates left by earlier blind-INSERT loads (keeps the newest
+--    row per key).
+-- 3. Replace the old non-unique index with a unique one on the match key.
+
+ALTER TABLE dbo.competitor_price_comparison
+    ADD competitor_catalog_key AS ISNULL(competitor_catalog_name, '') PERSISTED;
+GO
+
+WITH ranked AS (
+    SELECT ROW_NUMBER() OVER (
+        PARTITION BY gate_item_row_id, competitor_item_id, competitor_catalog_key
+        ORDER BY id DESC
+    ) AS rn
+    FROM dbo.competitor_price_comparison
+)
+DELETE FROM ranked WHERE rn > 1;
+
+DROP INDEX IF EXISTS ix_cpc_match_key ON dbo.competitor_price_comparison;
+
+CREATE UNIQUE INDEX ux_cpc_match_key
+    ON dbo.competitor_price_comparison (gate_item_row_id, competitor_item_id, competitor_catalog_key);
@@ -0,0 +1,137 @@
+# itemMappingAzure/embeddingStore.py
+
+import os
+import numpy as np
+from itemMappingAzure.logger import logger
+
+
+# ---------------------------------------------------------
+# BINARY EMBEDDING STORE
+#   <path>.f32  → raw float32 matrix, one row per embedding
+#   <path>.keys → "dim <n>" header, then one key per line (line i = row i)
+# Both files are append-only; rows are memory-mapped on load.
+# ---------------------------------------------------------
+class EmbeddingStore:
+    """Append-only on-disk embedding store with a key → row index."""
+
+    def __init__(self, path, flush_every=256):
+        self.matrix_path = f"{path}.f32"
+        self.keys_path = f"{path}.keys"
+        self.flush_every = flush_every
+
+        self.dim = None
+        self.index = {}        # key → row
+        self.matrix = None     # memmap over flushed rows
+        self.flushed = 0       # rows already on disk
+        self.pending = []      # vectors not yet flushed
+        self.pending_keys = []
+
+        self._load()
+
+    # -----------------------------------------------------
+    # LOAD
+    # -----------------------------------------------------
+    def _load(self):
+        if not os.path.exists(self.keys_path):
+            if os.path.exists(self.matrix_path):
+                # Rows of a first flush that died before writing any key
+                logger.warning(f"[CACHE] {self.matrix_path} has no key index; discarding it")
+                os.remove(self.matrix_path)
+            return
+
+        with open(self.keys_path, "r", encoding="utf-8") as f:
+            header = f.readline().split()
+            keys = f.read().splitlines()
+
+        if len(header) != 2 or header[0] != "dim":
+            raise ValueError(f"Corrupt embedding index: {self.keys_path}")
+        self.dim = int(header[1])
+
+        # Matrix rows are written before their keys, so rows without a key
+        # (interrupted flush) are simply ignored.
+        row_bytes = self.dim * 4
+        matrix_size = os.path.getsize(self.matrix_path) if os.path.exists(self.matrix_path) else 0
+        on_disk = matrix_size // row_bytes
+        if len(keys) > on_disk:
+            # Keys without rows (matrix file lost or cut short): rewrite the
+            # index, or rows appended later would pair with the wrong keys
+            keys = keys[:on_disk]
+            with open(self.keys_path, "w", encoding="utf-8") as f:
+                f.write(f"dim {self.dim}\n" + "".join(f"{k}\n" for k in keys))
+        if on_disk > len(keys) or matrix_size % row_bytes:
+            os.truncate(self.matrix_path, len(keys) * row_bytes)
+
+        self.index = {k: row for row, k in enumerate(keys)}
+        self.flushed = len(keys)
+        self._map()
+
+        logger.info(f"[CACHE] Loaded {self.flushed} embeddings from {self.matrix_path}")
+
+    def _map(self):
+        if self.flushed:
+            self.matrix = np.memmap(
+                self.matrix_path, dtype=np.float32, mode="r",
+                shape=(self.flushed, self.dim)
+            )
+
+    # -----------------------------------------------------
+    # READ / WRITE
+    # -----------------------------------------------------
+    def __contains__(self, key):
+        return key in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def get(self, key):
+        row = self.index.get(key)
+        if row is None:
+            return None
+        if row < self.flushed:
+            return self.matrix[row]
+        return self.pending[row - self.flushed]
+
+    def put(self, key, vector):
+        vector = np.asarray(vector, dtype=np.float32)
+
+        if self.dim is None:
+            self.dim = len(vector)
+        if len(vector) != self.dim:
+            raise ValueError(f"Embedding dim {len(vector)} != store dim {self.dim}")
+
+        if key in self.index:
+            return self.get(key)
+
+        self.index[key] = self.flushed + len(self.pending)
+        self.pending.append(vector)
+        self.pending_keys.append(key)
+
+        if len(self.pending) >= self.flush_every:
+            self.flush()
+        return vector
+
+    def flush(self):
+        """Append pending rows to disk and remap the matrix."""
+        if not self.pending:
+            return
+
+        new_file = not os.path.exists(self.keys_path)
+
+        # Rows past the indexed ones belong to an interrupted flush; append
+        # after the last keyed row so row numbers and keys stay aligned
+        keyed_bytes = self.flushed * self.dim * 4
+        if os.path.exists(self.matrix_path) and os.path.getsize(self.matrix_path) > keyed_bytes:
+            os.truncate(self.matrix_path, keyed_bytes)
+
+        with open(self.matrix_path, "ab") as f:
+            f.write(np.vstack(self.pending).astype(np.float32).tobytes())
+
+        with open(self.keys_path, "a", encoding="utf-8") as f:
+            if new_file:
+                f.write(f"dim {self.dim}\n")
+            f.write("".join(f"{k}\n" for k in self.pending_keys))
+
+        self.flushed += len(self.pending)
+        self.pending = []
+        self.pending_keys = []
+        self._map()
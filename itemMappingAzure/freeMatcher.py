@@ -1,163 +1,316 @@
 # itemMappingAzure/freeMatcher.py
 
 from itemMappingAzure.logger import logger
-from itemMappingAzure.db_loader import load_gate_group_items, load_competitor_items
+from itemMappingAzure.db_loader import iter_gate_group_items, iter_competitor_items
 from itemMappingAzure.azureEmbedder import (
-    get_embedding, enrich_name, enrich_desc, enrich_parent, enrich_sales
+    get_embeddings, flush_caches, enrich_name, enrich_desc, enrich_parent, enrich_sales
 )
+from vector_index import build_index
 
-import math
+import os
+import numpy as np
 
 
 # ---------------------------------------------------------
-# COSINE SIMILARITY
+# EMBEDDING PIPELINE
 # ---------------------------------------------------------
-def cosine(v1, v2):
-    return sum(a * b for a, b in zip(v1, v2))
+FIELDS = ("emb_name", "emb_desc", "emb_parent", "emb_sales")
 
 
-# ---------------------------------------------------------
-# EMBEDDING PIPELINE
-# ---------------------------------------------------------
-def embed_all_items():
-    logger.info("🔄 Embedding GateGroup + Competitor items...")
+def gg_item(g):
+    return {
+        "id": g.item_row_id,
+        "name": g.item_onboard_name or "",
+        "desc": g.item_description or "",
+        "parent": g.item_parent_sales_category_name or "",
+        "sales": g.item_sales_category_name or ""
+    }
 
-    gg_rows = load_gate_group_items()
-    comp_rows = load_competitor_items()
 
-    gg_embeds = []
-    comp_embeds = []
+def comp_item(c):
+    return {
+        "id": c.item_id,
+        "name": c.item_name or "",
+        "brand": c.brand or "",
+        "quantity": c.quantity or "",
+        "desc": c.Item_description or "",
+        "parent": c.parent_category or "",
+        "sales": c.sales_category or "",
+        "price": float(c.price) if c.price is not None else None,
+        "currency": c.currency,
+
+        # NEW → include competitor metadata directly from DB
+        "competitor_name": c.competitor_name,
+        "catalog_name": c.catalog_name,
+        "catalog_start": str(c.catalog_start) if c.catalog_start else None,
+        "catalog_end": str(c.catalog_end) if c.catalog_end else None,
+        "page": c.page
+    }
+
+
+def item_texts(gg_embeds, comp_embeds):
+    """The enriched texts embedded for each item: 4 per item, in FIELDS
+    order, GG items first."""
+    texts = []
 
     # -----------------------------------------------
     # Gate Group Embeddings
     # -----------------------------------------------
-    for g in gg_rows:
-        name = g.item_onboard_name or ""
-        desc = g.item_description or ""
-        parent = g.item_parent_sales_category_name or ""
-        sales = g.item_sales_category_name or ""
-
-        gg_embeds.append({
-            "id": g.item_row_id,
-            "name": name,
-            "desc": desc,
-            "parent": parent,
-            "sales": sales,
-
-            "emb_name": get_embedding(enrich_name(name), f"gg_name_{g.item_row_id}", "gg"),
-            "emb_desc": get_embedding(enrich_desc(desc), f"gg_desc_{g.item_row_id}", "gg"),
-            "emb_parent": get_embedding(enrich_parent(parent), f"gg_parent_{g.item_row_id}", "gg"),
-            "emb_sales": get_embedding(enrich_sales(sales), f"gg_sales_{g.item_row_id}", "gg")
-        })
+    for g in gg_embeds:
+        texts.extend([
+            enrich_name(g["name"]), enrich_desc(g["desc"]),
+            enrich_parent(g["parent"]), enrich_sales(g["sales"])
+        ])
 
     # -----------------------------------------------
     # Competitor Item Embeddings
     # -----------------------------------------------
-    for c in comp_rows:
-        name = c.item_name or ""
-        desc = c.Item_description or ""
-        brand = c.brand or ""
-        qty = c.quantity or ""
-        parent = c.parent_category or ""
-        sales = c.sales_category or ""
-
-        full_name = f"{brand} {name} {qty}".strip()
-
-        comp_embeds.append({
-            "id": c.item_id,
-            "name": name,
-            "brand": brand,
-            "quantity": qty,
-            "desc": desc,
-            "parent": parent,
-            "sales": sales,
-            "price": float(c.price) if c.price is not None else None,
-            "currency": c.currency,
-
-            # NEW → include competitor metadata directly from DB
-            "competitor_name": c.competitor_name,
-            "catalog_name": c.catalog_name,
-            "catalog_start": str(c.catalog_start) if c.catalog_start else None,
-            "catalog_end": str(c.catalog_end) if c.catalog_end else None,
-            "page": c.page,
-
-            # Embeddings
-            "emb_name": get_embedding(enrich_name(full_name), f"comp_name_{c.item_id}", "comp"),
-            "emb_desc": get_embedding(enrich_desc(desc), f"comp_desc_{c.item_id}", "comp"),
-            "emb_parent": get_embedding(enrich_parent(parent), f"comp_parent_{c.item_id}", "comp"),
-            "emb_sales": get_embedding(enrich_sales(sales), f"comp_sales_{c.item_id}", "comp")
-        })
+    for c in comp_embeds:
+        full_name = f"{c['brand']} {c['name']} {c['quantity']}".strip()
+        texts.extend([
+            enrich_name(full_name), enrich_desc(c["desc"]),
+            enrich_parent(c["parent"]), enrich_sales(c["sales"])
+        ])
+
+    return texts
+
+
+def embed_items(gg_embeds, comp_embeds):
+    """Attach the four field embeddings to GG and competitor item dicts."""
+    # One batched, deduped pass over all texts
+    vectors = get_embeddings(item_texts(gg_embeds, comp_embeds))
+    for i, item in enumerate(gg_embeds + comp_embeds):
+        for f, field in enumerate(FIELDS):
+            item[field] = vectors[i * len(FIELDS) + f]
+
+    flush_caches()
+
+
+def embed_streamed(gg_chunks, comp_chunks):
+    """Embed GG and competitor row chunks (db_loader.iter_*) into item dicts."""
+    gg_embeds = []
+    comp_embeds = []
+
+    # Embed chunk by chunk while the rows are still streaming in, so the
+    # first embedding batch does not wait for the whole query
+    for chunk in gg_chunks:
+        items = [gg_item(g) for g in chunk]
+        embed_items(items, [])
+        gg_embeds.extend(items)
+
+    for chunk in comp_chunks:
+        items = [comp_item(c) for c in chunk]
+        embed_items([], items)
+        comp_embeds.extend(items)
 
     return gg_embeds, comp_embeds
 
 
+def embed_all_items(source=None):
+    logger.info("🔄 Embedding GateGroup + Competitor items...")
+    return embed_streamed(iter_gate_group_items(source=source), iter_competitor_items(source=source))
+
+
 # ---------------------------------------------------------
 # MATCHING PIPELINE
 # ---------------------------------------------------------
+NAME_WEIGHT = 0.70
+DESC_WEIGHT = 0.20
+PARENT_WEIGHT = 0.05
+SALES_WEIGHT = 0.05
+SIM_THRESHOLD = 0.75
+
+WEIGHTS = np.array(
+    [NAME_WEIGHT, DESC_WEIGHT, PARENT_WEIGHT, SALES_WEIGHT], dtype=np.float32
+)
+
+# "all" (default) = exact scan of every pair. Otherwise a vector_index type
+# ("flat", "ivf", "hnsw") used to fetch TOP_K candidates per GG item before
+# full rescoring; this drops matches outside the top k, so only switch it
+# on once evaluate_recall() has shown TOP_K is safe for the catalogue.
+INDEX_TYPE = os.getenv("MATCH_INDEX_TYPE", "all")
+TOP_K = int(os.getenv("MATCH_TOP_K", "50"))
+
+
+def stack_embeddings(items, dim):
+    """Stack the four per-field embeddings into a contiguous float32
+    (n_items, 4, dim) tensor.
+
+    Failed embeddings (empty lists) become zero rows, so they score 0
+    against everything.
+    """
+    mat = np.zeros((len(items), len(FIELDS), dim), dtype=np.float32)
+    for row, item in enumerate(items):
+        for f, field in enumerate(FIELDS):
+            vec = item[field]
+            if len(vec):
+                mat[row, f] = vec
+    return mat
+
+
+def embedding_dim(*item_lists):
+    for items in item_lists:
+        for item in items:
+            for field in FIELDS:
+                if len(item[field]):
+                    return len(item[field])
+    return 0
+
+
+def score_all_pairs(gg_mat, comp_mat):
+    """Exact scan: weighted score of every GG x competitor pair."""
+    # Weighted blend in one matmul: scale each GG field by its weight and
+    # flatten the four fields into one (4 * dim) vector per item.
+    gg_weighted = (gg_mat * WEIGHTS[None, :, None]).reshape(len(gg_mat), -1)
+    final = gg_weighted @ comp_mat.reshape(len(comp_mat), -1).T
+
+    hit_rows, hit_cols = np.nonzero(final >= SIM_THRESHOLD)
+    return hit_rows, hit_cols
+
+
+def score_candidate_pairs(gg_mat, comp_mat, cand_ids, chunk=4096):
+    """Rescore only the top-k candidates returned by the vector index."""
+    k = cand_ids.shape[1]
+    rows = np.repeat(np.arange(len(gg_mat)), k)
+    cols = cand_ids.ravel()
+    valid = cols >= 0
+    rows, cols = rows[valid], cols[valid]
+
+    keep = np.zeros(len(rows), dtype=bool)
+    for start in range(0, len(rows), chunk):
+        r, c = rows[start:start + chunk], cols[start:start + chunk]
+        sims = np.einsum("pfd,pfd->pf", gg_mat[r], comp_mat[c])
+        keep[start:start + chunk] = sims @ WEIGHTS >= SIM_THRESHOLD
+
+    return rows[keep], cols[keep]
+
+
+def candidate_ids(gg_mat, comp_mat, index_type=INDEX_TYPE, k=TOP_K):
+    """Top-k competitor candidates per GG item, retrieved on name embeddings."""
+    index = build_index(index_type, comp_mat[:, 0])
+    _, ids = index.search(gg_mat[:, 0], k)
+    return ids
+
+
+def evaluate_recall(ks=(10, 25, 50, 100), index_type="flat"):
+    """Log recall@k of the candidate retrieval against the exact scan.
+
+    Recall is the share of above-threshold pairs from the exhaustive scan
+    that survive top-k retrieval, which is what decides a safe k.
+    """
+    gg_embeds, comp_embeds = embed_all_items()
+    dim = embedding_dim(gg_embeds, comp_embeds)
+    gg_mat = stack_embeddings(gg_embeds, dim)
+    comp_mat = stack_embeddings(comp_embeds, dim)
+
+    exact = set(zip(*(a.tolist() for a in score_all_pairs(gg_mat, comp_mat))))
+    report = {}
+
+    for k in ks:
+        ids = candidate_ids(gg_mat, comp_mat, index_type, k)
+        found = set(zip(*(a.tolist() for a in score_candidate_pairs(gg_mat, comp_mat, ids))))
+        report[k] = len(found & exact) / len(exact) if exact else 1.0
+        logger.info(
+            f"[INDEX] {index_type} recall@{k}: {report[k]:.4f} "
+            f"({len(found & exact)}/{len(exact)} matches)"
+        )
+
+    return report
+
+
 def match_items_free():
     logger.info("🔍 Starting semantic matching...")
 
     gg_embeds, comp_embeds = embed_all_items()
-    results = []
-    NAME_WEIGHT = 0.70
-    DESC_WEIGHT = 0.20
-    PARENT_WEIGHT = 0.05
-    SALES_WEIGHT = 0.05
-    SIM_THRESHOLD = 0.75
-
-    for gg in gg_embeds:
+    results = match_embedded(gg_embeds, comp_embeds)
+
+    logger.info("✅ Matching complete.")
+    return results
+
+
+def match_embedded(gg_embeds, comp_embeds):
+    """Score already-embedded GG items against competitor items."""
+    return list(iter_matches(gg_embeds, comp_embeds))
+
+
+def iter_matches(gg_embeds, comp_embeds):
+    """Yield one result block per matched GG item, in GG order, as soon as
+    it is built (scores are computed up front, blocks lazily)."""
+    # Check for empty sides first: items of an empty side's counterpart
+    # may not have been embedded at all (incremental runs)
+    if not gg_embeds or not comp_embeds:
+        return
+    dim = embedding_dim(gg_embeds, comp_embeds)
+    if not dim:
+        return
+
+    gg_mat = stack_embeddings(gg_embeds, dim)
+    comp_mat = stack_embeddings(comp_embeds, dim)
+
+    if INDEX_TYPE == "all":
+        hit_rows, hit_cols = score_all_pairs(gg_mat, comp_mat)
+    else:
+        logger.info(f"[INDEX] Retrieving top-{TOP_K} candidates ({INDEX_TYPE})...")
+        ids = candidate_ids(gg_mat, comp_mat, INDEX_TYPE, TOP_K)
+        hit_rows, hit_cols = score_candidate_pairs(gg_mat, comp_mat, ids)
+
+    # Per-field similarities are only needed for the pairs we keep
+    field_sims = np.einsum("pfd,pfd->pf", gg_mat[hit_rows], comp_mat[hit_cols])
+    hit_scores = field_sims @ WEIGHTS
+
+    # Group by GG row, best score first
+    order = np.lexsort((hit_cols, -np.round(hit_scores, 4), hit_rows))
+    hit_rows, hit_cols = hit_rows[order], hit_cols[order]
+    hit_scores, field_sims = hit_scores[order], field_sims[order]
+    bounds = np.flatnonzero(np.diff(hit_rows)) + 1
+
+    for rows, cols, scores, sims in zip(
+        np.split(hit_rows, bounds),
+        np.split(hit_cols, bounds),
+        np.split(hit_scores, bounds),
+        np.split(field_sims, bounds),
+    ):
+        if not len(rows):
+            continue
+
+        gg = gg_embeds[rows[0]]
         matches = []
 
-        for comp in comp_embeds:
-            sim_name = cosine(gg["emb_name"], comp["emb_name"])
-            sim_desc = cosine(gg["emb_desc"], comp["emb_desc"])
-            sim_parent = cosine(gg["emb_parent"], comp["emb_parent"])
-            sim_sales = cosine(gg["emb_sales"], comp["emb_sales"])
-
-            final = (
-                sim_name * NAME_WEIGHT +
-                sim_desc * DESC_WEIGHT +
-                sim_parent * PARENT_WEIGHT +
-                sim_sales * SALES_WEIGHT
-            )
-
-            if final >= SIM_THRESHOLD:
-                matches.append({
-                    "competitor_item_id": comp["id"],
-                    "competitor_item_name": comp["name"],
-                    "brand": comp["brand"],
-                    "quantity": comp["quantity"],
-                    "competitor_description": comp["desc"],
-                    "parent_category": comp["parent"],
-                    "sales_category": comp["sales"],
-                    "price": comp.get("price"),
-                    "currency": comp.get("currency"),
-
-                    "competitor_name": comp.get("competitor_name"),
-                    "catalog_name": comp.get("catalog_name"),
-                    "catalog_start": comp.get("catalog_start"),
-                    "catalog_end": comp.get("catalog_end"),
-                    "competitor_page": comp.get("page"),
-
-                    "similarity_name": round(sim_name, 4),
-                    "similarity_desc": round(sim_desc, 4),
-                    "similarity_parent": round(sim_parent, 4),
-                    "similarity_sales": round(sim_sales, 4),
-                    "similarity_final": round(final, 4)
-})
-        matches.sort(key=lambda x: x["similarity_final"], reverse=True)
-
-        if matches:
-            results.append({
-                "gate_item": {
-                    "id": gg["id"],
-                    "name": gg["name"],
-                    "desc": gg["desc"],
-                    "parent_category": gg["parent"],
-                    "sales_category": gg["sales"]
-                },
-                "matches": matches
+        for ci, score, (sim_name, sim_desc, sim_parent, sim_sales) in zip(
+            cols.tolist(), scores.tolist(), sims.tolist()
+        ):
+            comp = comp_embeds[ci]
+            matches.append({
+                "competitor_item_id": comp["id"],
+                "competitor_item_name": comp["name"],
+                "brand": comp["brand"],
+                "quantity": comp["quantity"],
+                "competitor_description": comp["desc"],
+                "parent_category": comp["parent"],
+                "sales_category": comp["sales"],
+                "price": comp.get("price"),
+                "currency": comp.get("currency"),
+
+                "competitor_name": comp.get("competitor_name"),
+                "catalog_name": comp.get("catalog_name"),
+                "catalog_start": comp.get("catalog_start"),
+                "catalog_end": comp.get("catalog_end"),
+                "competitor_page": comp.get("page"),
+
+                "similarity_name": round(sim_name, 4),
+                "similarity_desc": round(sim_desc, 4),
+                "similarity_parent": round(sim_parent, 4),
+                "similarity_sales": round(sim_sales, 4),
+                "similarity_final": round(score, 4)
             })
 
-    logger.info("✅ Matching complete.")
-    return results
+        yield {
+            "gate_item": {
+                "id": gg["id"],
+                "name": gg["name"],
+                "desc": gg["desc"],
+                "parent_category": gg["parent"],
+                "sales_category": gg["sales"]
+            },
+            "matches": matches
+        }
@@ -0,0 +1,253 @@
+# itemMappingAzure/incrementalMatcher.py
+
+import os
+import json
+import hashlib
+
+from itemMappingAzure.logger import logger
+from itemMappingAzure.db_loader import (
+    load_gate_group_items, load_competitor_items, iter_gate_group_items, iter_competitor_items
+)
+from itemMappingAzure.azureEmbedder import MODEL
+from result_writer import iter_results
+from itemMappingAzure.freeMatcher import (
+    gg_item, comp_item, embed_items, embed_streamed, match_embedded, iter_matches,
+    FIELDS, WEIGHTS, SIM_THRESHOLD, INDEX_TYPE, TOP_K
+)
+
+STATE_PATH = os.getenv("MATCH_STATE_PATH", "match_state.json")
+
+
+# ---------------------------------------------------------
+# CHANGE TRACKING
+# ---------------------------------------------------------
+def content_hash(item):
+    # Item fields only: full runs hash items that already carry embeddings
+    content = {k: v for k, v in item.items() if k not in FIELDS}
+    return hashlib.sha256(
+        json.dumps(content, sort_keys=True, default=str).encode("utf-8")
+    ).hexdigest()
+
+
+def comp_watermark(comp_rows, current=None):
+    """Latest competitor created_at (as a string) among `comp_rows` and `current`."""
+    stamps = [str(c.created_at) for c in comp_rows if c.created_at is not None]
+    if current is not None:
+        stamps.append(current)
+    return max(stamps, default=None)
+
+
+def matcher_config():
+    """Anything that changes scores; a mismatch forces a full rerun."""
+    return {
+        "model": MODEL,
+        "weights": [round(float(w), 4) for w in WEIGHTS],
+        "threshold": SIM_THRESHOLD,
+        "index_type": INDEX_TYPE,
+        "top_k": TOP_K,
+    }
+
+
+def build_state(results_path, gg_all, comp_all, watermark):
+    return {
+        "config": matcher_config(),
+        # The state only describes this file (.json and .jsonl runs differ)
+        "results_path": results_path,
+        "gg": {str(g["id"]): content_hash(g) for g in gg_all},
+        "comp": {str(c["id"]): content_hash(c) for c in comp_all},
+        "comp_watermark": watermark,
+    }
+
+
+def load_state(path=STATE_PATH):
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_state(state, path=STATE_PATH):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(state, f)
+    os.replace(tmp, path)
+
+
+def discard_state(path=STATE_PATH):
+    """Call before overwriting the results: if the run dies halfway, the
+    next one must not trust the half-written file."""
+    if os.path.exists(path):
+        os.remove(path)
+
+
+def load_previous_results(path):
+    if not os.path.exists(path):
+        return None
+    return list(iter_results(path))
+
+
+def pair_keys(block):
+    """The comparison-table keys of a block's matches (sql_engine.match_key)."""
+    gg_id = block["gate_item"]["id"]
+    return {
+        (gg_id, m["competitor_item_id"], "" if m.get("catalog_name") is None else m["catalog_name"])
+        for m in block["matches"]
+    }
+
+
+def track_retractions(blocks, previous):
+    """Wrap `blocks`; once the wrapper is consumed, `retracted` holds the
+    keys of every previous match that this run no longer produces (removed
+    GG or competitor item, or a score now below threshold). File sinks
+    drop those by rewriting the file; the SQL sink must delete them."""
+    retracted = []
+
+    def tracked():
+        remaining = {block["gate_item"]["id"]: pair_keys(block) for block in previous or []}
+        for block in blocks:
+            yield block
+            retracted.extend(remaining.pop(block["gate_item"]["id"], set()) - pair_keys(block))
+        for keys in remaining.values():
+            retracted.extend(keys)
+
+    return tracked(), retracted
+
+
+# ---------------------------------------------------------
+# INCREMENTAL MATCHING
+# ---------------------------------------------------------
+def sort_matches(matches, comp_position):
+    # Same order as a full run: best score first, then competitor order
+    matches.sort(key=lambda m: (-m["similarity_final"],
+                                comp_position.get(m["competitor_item_id"], 0)))
+    return matches
+
+
+def match_items_incremental(results_path, state_path=STATE_PATH, full=False, source=None):
+    """Rescore only what changed since the previous run.
+
+    - new/changed GG items (content hash) are scored against every competitor
+    - unchanged GG items are scored only against new/changed competitors
+      (new id, changed content, or created_at past the last watermark)
+    - matches of removed or rescored competitors, and blocks of removed GG
+      items, are retracted from the previous results
+
+    `source` is "sql" or "snapshot" (default: db_loader.DATA_SOURCE).
+    Returns (blocks, retracted, state): `blocks` yields the result blocks
+    lazily, in GG order, for a streaming writer; once it is exhausted,
+    `retracted` lists the keys of previous matches that are gone (see
+    track_retractions), for sink.retract(). Everything read from
+    `results_path` is loaded before returning, so the writer may overwrite
+    it. Save the state only after the results are written.
+    """
+    # Without a results file (SQL-only sink) there is nothing to diff against
+    full = full or results_path is None
+    prev_state = None if full else load_state(state_path)
+    previous = None if full else load_previous_results(results_path)
+
+    if (prev_state is None or previous is None
+            or prev_state.get("config") != matcher_config()
+            or prev_state.get("results_path") != results_path):
+        logger.info("🔁 Full matching run (--full, or no usable previous state).")
+
+        # Everything gets embedded: do it chunk by chunk while the rows
+        # are still streaming in (see freeMatcher.embed_streamed)
+        watermark = [None]
+
+        def comp_chunks():
+            for chunk in iter_competitor_items(source=source):
+                watermark[0] = comp_watermark(chunk, watermark[0])
+                yield chunk
+
+        gg_all, comp_all = embed_streamed(iter_gate_group_items(source=source), comp_chunks())
+        state = build_state(results_path, gg_all, comp_all, watermark[0])
+        # With previous results (e.g. a config change) their stale rows are retracted too
+        return (*track_retractions(iter_matches(gg_all, comp_all), previous), state)
+
+    gg_rows = load_gate_group_items(source=source)
+    comp_rows = load_competitor_items(source=source)
+
+    gg_all = [gg_item(g) for g in gg_rows]
+    comp_all = [comp_item(c) for c in comp_rows]
+    state = build_state(results_path, gg_all, comp_all, comp_watermark(comp_rows))
+
+    # -----------------------------------------------
+    # Diff against the previous run
+    # -----------------------------------------------
+    watermark = prev_state.get("comp_watermark")
+
+    gg_changed = [g for g in gg_all if prev_state["gg"].get(str(g["id"])) != state["gg"][str(g["id"])]]
+    gg_same = [g for g in gg_all if prev_state["gg"].get(str(g["id"])) == state["gg"][str(g["id"])]]
+
+    comp_dirty = [
+        c for c, row in zip(comp_all, comp_rows)
+        if prev_state["comp"].get(str(c["id"])) != state["comp"][str(c["id"])]
+        or (watermark is not None and row.created_at is not None and str(row.created_at) > watermark)
+    ]
+
+    dirty_ids = {c["id"] for c in comp_dirty}
+    current_comp_ids = {c["id"] for c in comp_all}
+    removed_comp = len(set(prev_state["comp"]) - set(state["comp"]))
+    removed_gg = len(set(prev_state["gg"]) - set(state["gg"]))
+
+    logger.info(
+        f"🔁 Incremental run: {len(gg_changed)} new/changed GG, {len(comp_dirty)} new/changed "
+        f"competitor items, {removed_gg} GG + {removed_comp} competitor items removed"
+    )
+
+    if INDEX_TYPE != "all" and (comp_dirty or removed_comp):
+        # A top-k index keeps only each GG item's TOP_K nearest competitors,
+        # and any competitor change can shift those sets: rescore every GG
+        # item against the whole competitor list, as a full run would
+        logger.info(f"🔁 {INDEX_TYPE} index: competitor set changed, rescoring all GG items.")
+        gg_changed, gg_same = gg_all, []
+
+    # -----------------------------------------------
+    # Embed + score only the affected slices
+    # -----------------------------------------------
+    gg_needed = gg_all if comp_dirty else gg_changed
+    comp_needed = comp_all if gg_changed else comp_dirty
+    embed_items(gg_needed, comp_needed)
+
+    fresh = {}
+    for block in match_embedded(gg_changed, comp_all):
+        fresh[block["gate_item"]["id"]] = block["matches"]
+
+    added = {}
+    for block in match_embedded(gg_same, comp_dirty):
+        added[block["gate_item"]["id"]] = block["matches"]
+
+    # -----------------------------------------------
+    # Merge into the previous result set
+    # -----------------------------------------------
+    prev_blocks = {block["gate_item"]["id"]: block for block in previous}
+    comp_position = {c["id"]: i for i, c in enumerate(comp_all)}
+    changed_ids = {g["id"] for g in gg_changed}
+
+    def merged_blocks():
+        for g in gg_all:
+            if g["id"] in changed_ids:
+                matches = fresh.get(g["id"], [])
+            else:
+                kept = [
+                    m for m in prev_blocks.get(g["id"], {}).get("matches", [])
+                    if m["competitor_item_id"] in current_comp_ids
+                    and m["competitor_item_id"] not in dirty_ids
+                ]
+                matches = sort_matches(kept + added.get(g["id"], []), comp_position)
+
+            if not matches:
+                continue
+
+            yield {
+                "gate_item": {
+                    "id": g["id"],
+                    "name": g["name"],
+                    "desc": g["desc"],
+                    "parent_category": g["parent"],
+                    "sales_category": g["sales"]
+                },
+                "matches": matches
+            }
+
+    return (*track_retractions(merged_blocks(), previous), state)
@@ -1,24 +1,65 @@
 # main.py
 
-import json
+import sys
 import time
 import decimal
 from itemMappingAzure.logger import logger
-from itemMappingAzure.freeMatcher import match_items_free
+from itemMappingAzure.incrementalMatcher import match_items_incremental, save_state, discard_state
+from itemMappingAzure.azureEmbedder import CACHE_STATS
+from itemMappingAzure.config import pool_metrics
+from itemMappingAzure.db_loader import DATA_SOURCE
+from result_writer import result_path, RESULT_COMPACT
+from itemMappingAzure import Compariosn_JsonToDB_loader as comparison_loader
+from result_sink import open_sink, RESULT_SINK
+
+RESULTS_PATH = "price_comparison_matches.json"
 
 def convert_decimal(obj):
     if isinstance(obj, decimal.Decimal):
         return float(obj)
     return obj
 
+def arg_value(name, default):
+    prefix = f"--{name}="
+    return next((a[len(prefix):] for a in sys.argv if a.startswith(prefix)), default)
+
 if __name__ == "__main__":
     start = time.time()
     logger.info("🚀 Starting Azure semantic matching pipeline...")
 
-    result = match_items_free()
+    # --source=snapshot reads the latest Arrow snapshot instead of Azure SQL
+    source = arg_value("source", DATA_SOURCE)
+    if source == "snapshot":
+        from itemMappingAzure.snapshot import seed_embedding_cache
+        seed_embedding_cache()
+
+    # --sink=json|jsonl|sql or a mix ("jsonl,sql"); sql loads the comparison
+    # table directly, no JSON round trip. --jsonl = --sink=jsonl,
+    # --compact: no indentation
+    sink_spec = arg_value("sink", "jsonl" if "--jsonl" in sys.argv else RESULT_SINK)
+    file_formats = [s.strip() for s in sink_spec.split(",") if s.strip() in ("json", "jsonl")]
+    # Incremental runs diff against the first file sink's output
+    results_path = result_path(RESULTS_PATH, file_formats[0]) if file_formats else None
+
+    # Only new/changed items are rescored; --full recomputes everything
+    blocks, retracted, state = match_items_incremental(results_path, full="--full" in sys.argv, source=source)
+    discard_state()
+
+    # Blocks are written as they are produced, never held as one list
+    with open_sink(sink_spec, RESULTS_PATH, "--compact" in sys.argv or RESULT_COMPACT,
+                   default=convert_decimal, loader=comparison_loader) as sink:
+        sink.write_all(blocks)
+        # Matches dropped since the previous run (only the SQL sink acts on them)
+        sink.retract(retracted)
 
-    with open("price_comparison_matches.json", "w", encoding="utf-8") as f:
-        json.dump(result, f, indent=2, ensure_ascii=False, default=convert_decimal)
+    if results_path:
+        save_state(state)
+    logger.info(f"💾 Results → {sink.target}")
 
+    logger.info(
+        f"🧠 Embedding cache: {CACHE_STATS['hits']} hits, "
+        f"{CACHE_STATS['misses']} misses"
+    )
+    logger.info(f"🔌 SQL pool: {pool_metrics.summary()}")
     logger.info(f"⏳ Runtime: {round(time.time() - start, 2)} sec")
     logger.info("🎉 Completed.")
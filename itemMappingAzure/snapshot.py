@@ -0,0 +1,233 @@
+# itemMappingAzure/snapshot.py
+#
+# Versioned Arrow snapshots of the source tables, so development and
+# benchmark runs start without Azure SQL (and are reproducible):
+#
+#   python -m itemMappingAzure.snapshot                 (tables only)
+#   python -m itemMappingAzure.snapshot --embeddings    (+ item embeddings)
+#   python -m itemMappingAzure.main --source=snapshot
+#
+# Layout:
+#   <SNAPSHOT_DIR>/<version>/<table>.arrow      Arrow IPC file per table
+#   <SNAPSHOT_DIR>/<version>/embeddings.arrow   key + fixed-size-list vector
+#   <SNAPSHOT_DIR>/<version>/manifest.json      written last (= complete)
+#   <SNAPSHOT_DIR>/LATEST                       newest complete version
+#
+# Files are uncompressed Arrow IPC so reads are memory-mapped, zero-copy.
+
+import os
+import sys
+import json
+from datetime import datetime, timezone
+
+import numpy as np
+from sqlalchemy import text
+
+from itemMappingAzure.logger import logger
+from itemMappingAzure.config import connect, STREAM_BATCH_SIZE
+from itemMappingAzure.azureEmbedder import MODEL, cache_key, get_cache, get_embeddings
+from itemMappingAzure.db_loader import load_gate_group_items, load_competitor_items
+from itemMappingAzure.freeMatcher import gg_item, comp_item, item_texts
+
+try:
+    import pyarrow as pa
+    import pyarrow.compute as pc
+except ImportError:  # optional: only snapshot export / --source=snapshot need it
+    pa = None
+
+SNAPSHOT_DIR = os.getenv("SNAPSHOT_DIR", "snapshots")
+SNAPSHOT_VERSION = os.getenv("SNAPSHOT_VERSION", "latest")
+
+TABLES = ["item", "item_price", "competitor_item_details"]
+
+# Mirrors the WHERE clause of db_loader.GATE_GROUP_SQL
+GATE_PARENT_CATEGORIES = ["1.Cafe", "2.Boutique", "3.Virtual", "4.Duty Free"]
+GATE_COLUMNS = [
+    "item_row_id", "item_onboard_name", "item_description",
+    "item_parent_sales_category_name", "item_sales_category_name",
+]
+
+
+def require_pyarrow():
+    if pa is None:
+        raise ImportError("pyarrow is not installed; it is required for snapshots")
+
+
+# ---------------------------------------------------------
+# VERSIONS + MANIFEST
+# ---------------------------------------------------------
+def resolve_version(version=SNAPSHOT_VERSION):
+    if version != "latest":
+        return version
+
+    latest = os.path.join(SNAPSHOT_DIR, "LATEST")
+    if not os.path.exists(latest):
+        raise FileNotFoundError(f"No snapshot in {SNAPSHOT_DIR}; run python -m itemMappingAzure.snapshot")
+    with open(latest, "r", encoding="utf-8") as f:
+        return f.read().strip()
+
+
+def snapshot_path(version=SNAPSHOT_VERSION):
+    return os.path.join(SNAPSHOT_DIR, resolve_version(version))
+
+
+def load_manifest(version=SNAPSHOT_VERSION):
+    with open(os.path.join(snapshot_path(version), "manifest.json"), "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_json(path, data):
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp, path)
+
+
+# ---------------------------------------------------------
+# EXPORT
+# ---------------------------------------------------------
+def write_arrow(path, table):
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table, max_chunksize=STREAM_BATCH_SIZE)
+
+
+def export_table(out_dir, table_name):
+    """Stream one source table into <out_dir>/<table_name>.arrow."""
+    chunks = []
+    with connect() as conn:
+        result = conn.execution_options(yield_per=STREAM_BATCH_SIZE).execute(
+            text(f"SELECT * FROM dbo.{table_name}")
+        )
+        columns = list(result.keys())
+        for rows in result.partitions():
+            chunks.append(pa.Table.from_pylist([dict(r._mapping) for r in rows]))
+
+    if chunks:
+        # Columns that were all NULL in one chunk get their type from the others
+        table = pa.concat_tables(chunks, promote_options="permissive")
+    else:
+        table = pa.table({c: pa.array([], pa.null()) for c in columns})
+
+    write_arrow(os.path.join(out_dir, f"{table_name}.arrow"), table)
+    logger.info(f"📦 {table_name}: {table.num_rows} rows")
+    return {"file": f"{table_name}.arrow", "rows": table.num_rows, "columns": table.column_names}
+
+
+def export_embeddings(out_dir, version):
+    """Embed the snapshot's GG + competitor items (through the embedding
+    cache) and store them as key → fixed-size-list<float32> vectors."""
+    gg = [gg_item(g) for g in load_gate_group_items(source="snapshot", version=version)]
+    comp = [comp_item(c) for c in load_competitor_items(source="snapshot", version=version)]
+
+    texts = list(dict.fromkeys(item_texts(gg, comp)))
+    vectors = get_embeddings(texts)
+    get_cache().flush()
+
+    keys, kept = [], []
+    for t, vec in zip(texts, vectors):
+        if len(vec):  # failed requests come back empty
+            keys.append(cache_key(t))
+            kept.append(vec)
+
+    dim = len(kept[0]) if kept else 0
+    matrix = np.asarray(kept, dtype=np.float32).reshape(len(kept), dim)
+    table = pa.table({
+        "key": pa.array(keys, pa.string()),
+        "embedding": pa.FixedSizeListArray.from_arrays(pa.array(matrix.ravel(), pa.float32()), dim),
+    })
+
+    write_arrow(os.path.join(out_dir, "embeddings.arrow"), table)
+    logger.info(f"📦 embeddings: {len(keys)} vectors (dim {dim})")
+    return {"file": "embeddings.arrow", "rows": len(keys), "dim": dim, "model": MODEL}
+
+
+def export_snapshot(with_embeddings=False):
+    """Write a new snapshot version and point LATEST at it."""
+    require_pyarrow()
+
+    version = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+    out_dir = os.path.join(SNAPSHOT_DIR, version)
+    os.makedirs(out_dir, exist_ok=True)
+    logger.info(f"📸 Writing snapshot {version} → {out_dir}")
+
+    manifest = {
+        "version": version,
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "tables": {name: export_table(out_dir, name) for name in TABLES},
+    }
+    # Built from the table files just written, so vectors match the snapshot
+    manifest["embeddings"] = export_embeddings(out_dir, version) if with_embeddings else None
+    write_json(os.path.join(out_dir, "manifest.json"), manifest)
+
+    with open(os.path.join(SNAPSHOT_DIR, "LATEST"), "w", encoding="utf-8") as f:
+        f.write(version)
+    return version
+
+
+# ---------------------------------------------------------
+# READ (zero-copy, memory-mapped)
+# ---------------------------------------------------------
+def open_table(table_name, version=SNAPSHOT_VERSION):
+    require_pyarrow()
+    path = os.path.join(snapshot_path(version), f"{table_name}.arrow")
+    # The returned table's buffers keep the memory map alive
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def gate_group_table(version=SNAPSHOT_VERSION):
+    """Snapshot equivalent of db_loader.GATE_GROUP_SQL."""
+    table = open_table("item", version).select(GATE_COLUMNS)
+    # Compared lower-cased, like SQL Server's case-insensitive collation
+    parents = pa.array([c.lower() for c in GATE_PARENT_CATEGORIES])
+    mask = pc.and_(
+        pc.is_in(pc.utf8_lower(table["item_parent_sales_category_name"]), value_set=parents),
+        pc.not_equal(pc.utf8_lower(table["item_sales_category_name"]), "logo"),
+    )
+    # GROUP BY all columns == DISTINCT rows
+    return table.filter(mask).group_by(GATE_COLUMNS, use_threads=False).aggregate([])
+
+
+def competitor_table(version=SNAPSHOT_VERSION):
+    return open_table("competitor_item_details", version)
+
+
+def iter_rows(table, columns, chunk_size=STREAM_BATCH_SIZE):
+    """Yield lists of row dicts (only `columns` that the snapshot has)."""
+    table = table.select([c for c in columns if c in table.column_names])
+    for batch in table.to_batches(max_chunksize=chunk_size):
+        yield batch.to_pylist()
+
+
+def seed_embedding_cache(version=SNAPSHOT_VERSION):
+    """Copy the snapshot's embeddings into the embedding cache so a
+    snapshot run needs no embedding requests. Returns vectors added."""
+    embeddings = load_manifest(version).get("embeddings")
+    if not embeddings:
+        return 0
+    if embeddings["model"] != MODEL:
+        logger.warning(f"Snapshot embeddings are from {embeddings['model']}, not {MODEL}; ignored.")
+        return 0
+
+    table = open_table("embeddings", version)
+    dim = table.schema.field("embedding").type.list_size
+    vectors = (
+        table["embedding"].combine_chunks().flatten()
+        .to_numpy(zero_copy_only=True).reshape(-1, dim)
+    )
+
+    cache = get_cache()
+    added = 0
+    for key, vec in zip(table["key"].to_pylist(), vectors):
+        if key not in cache:
+            cache.put(key, vec)
+            added += 1
+    cache.flush()
+
+    logger.info(f"🧠 Seeded {added} embeddings from snapshot {resolve_version(version)}")
+    return added
+
+
+if __name__ == "__main__":
+    version = export_snapshot(with_embeddings="--embeddings" in sys.argv)
+    logger.info(f"🎉 Snapshot {version} complete.")
@@ -1,26 +1,25 @@
 import json
 import os
-from sqlalchemy import create_engine, text
-from dotenv import load_dotenv
-
-load_dotenv()
+import time
+from sqlalchemy import text
 
 # ---------------------------------------------------------
-# SQL CONNECTION
+# SQL CONNECTION (shared pooled engine, see config.py)
 # ---------------------------------------------------------
-server = os.getenv("AZURE_SQL_SERVER")
-database = os.getenv("AZURE_SQL_DATABASE")
-username = os.getenv("AZURE_SQL_USERNAME")
-password = os.getenv("AZURE_SQL_PASSWORD")
-
-connection_string = f"mssql+pymssql://{username}:{password}@{server}/{database}"
-engine = create_engine(connection_string)
+from config import begin, pool_metrics, SQL_DRIVER
 
 # ---------------------------------------------------------
 # FOLDER CONTAINING MULTIPLE JSON FILES
 # ---------------------------------------------------------
 OUTPUT_FOLDER = "../pdf_item_extract_llm/llm_output"  # Adjust the path as needed
 
+# Rows sent per round trip
+BATCH_SIZE = int(os.getenv("JSON_LOAD_BATCH_SIZE", "1000"))
+# "values" (multi-row INSERT ... VALUES, far fewer round trips on drivers
+# whose executemany loops per row, e.g. pymssql) or "executemany" (the
+# default only for pyodbc, whose fast_executemany already batches)
+LOAD_MODE = os.getenv("JSON_LOAD_MODE", "executemany" if SQL_DRIVER == "pyodbc" else "values")
+
 json_files = [
     f for f in os.listdir(OUTPUT_FOLDER)
     if f.lower().endswith(".json")
@@ -33,6 +32,70 @@ if not json_files:
 print(f"📁 Found {len(json_files)} JSON files to process.\n")
 
 
+# ---------------------------------------------------------
+# STREAMING JSON ARRAY READER
+# ---------------------------------------------------------
+def iter_json_items(file_path, chunk_size=1 << 20):
+    """Yield the elements of a top-level JSON array one at a time,
+    without loading the whole file into memory."""
+    decoder = json.JSONDecoder()
+    whitespace = " \t\r\n"
+
+    with open(file_path, "r", encoding="utf-8") as f:
+        # Decoding works in place from `pos`; the consumed prefix is only
+        # dropped when a new chunk is appended (slicing the buffer after
+        # every item would make parsing quadratic)
+        buf, pos, eof = "", 0, False
+
+        def read_more():
+            nonlocal buf, pos, eof
+            chunk = f.read(chunk_size)
+            eof = not chunk
+            buf = buf[pos:] + chunk
+            pos = 0
+
+        def skip(chars):
+            """Advance past `chars`, reading on while the buffer runs out."""
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in chars:
+                    pos += 1
+                if pos < len(buf) or eof:
+                    return
+                read_more()
+
+        skip(whitespace)
+        if pos == len(buf) or buf[pos] != "[":
+            raise ValueError(f"{file_path}: expected a JSON array")
+        pos += 1
+
+        while True:
+            skip(whitespace + ",")
+            if pos == len(buf):
+                raise json.JSONDecodeError("Unterminated array", buf, pos)
+            if buf[pos] == "]":
+                return
+
+            try:
+                item, end = decoder.raw_decode(buf, pos)
+                # The value is only complete once the "," or "]" after it
+                # is in the buffer: a number cut at a chunk boundary
+                # ("1." | "5") decodes as a shorter one
+                after = end
+                while after < len(buf) and buf[after] in whitespace:
+                    after += 1
+                if after == len(buf) or buf[after] not in ",]":
+                    raise json.JSONDecodeError("Expecting ',' delimiter", buf, after)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                read_more()
+                continue
+
+            yield item
+            pos = end
+
+
 # ---------------------------------------------------------
 # MAPPING FUNCTION
 # ---------------------------------------------------------
@@ -91,12 +154,45 @@ VALUES (
 """)
 
 
+COLUMNS = list(map_keys({}).keys())
+
+# SQL Server allows at most 2100 parameters and 1000 rows per VALUES list
+VALUES_ROWS = min(1000, 2099 // len(COLUMNS))
+
+
+def values_insert_sql(n_rows):
+    rows = ", ".join(
+        "(" + ", ".join(f":{col}_{i}" for col in COLUMNS) + ")"
+        for i in range(n_rows)
+    )
+    return text(
+        f"INSERT INTO dbo.competitor_item_details ({', '.join(COLUMNS)}) VALUES {rows}"
+    )
+
+
+# ---------------------------------------------------------
+# BATCH INSERT
+# ---------------------------------------------------------
+def insert_batch(conn, rows):
+    if LOAD_MODE == "values":
+        for start in range(0, len(rows), VALUES_ROWS):
+            chunk = rows[start:start + VALUES_ROWS]
+            params = {
+                f"{col}_{i}": row[col]
+                for i, row in enumerate(chunk)
+                for col in COLUMNS
+            }
+            conn.execute(values_insert_sql(len(chunk)), params)
+    else:
+        conn.execute(insert_sql, rows)
+
+
 # ---------------------------------------------------------
 # VALIDATION: Must have item name + price
 # ---------------------------------------------------------
 def is_invalid(mapped):
     return (
-        mapped["item_name"] is None or
+        not isinstance(mapped["item_name"], str) or
         mapped["item_name"].strip() == "" or
         mapped["price"] is None
     )
@@ -113,27 +209,34 @@ for json_file in json_files:
     file_path = os.path.join(OUTPUT_FOLDER, json_file)
     print(f"\n📄 Processing file: {json_file}")
 
-    with open(file_path, "r", encoding="utf-8") as f:
-        items = json.load(f)
-
-    print(f"   → Loaded {len(items)} items")
-
     count_inserted = 0
     count_skipped = 0
+    started = time.perf_counter()
 
-    with engine.begin() as conn:
-        for raw in items:
-            mapped = map_keys(raw)
+    with begin() as conn:
+        batch = []
+        for raw in iter_json_items(file_path):
+            mapped = map_keys(raw) if isinstance(raw, dict) else None
 
-            if is_invalid(mapped):
+            if mapped is None or is_invalid(mapped):
                 count_skipped += 1
                 continue
 
-            conn.execute(insert_sql, mapped)
-            count_inserted += 1
+            batch.append(mapped)
+            if len(batch) >= BATCH_SIZE:
+                insert_batch(conn, batch)
+                count_inserted += len(batch)
+                batch = []
+
+        if batch:
+            insert_batch(conn, batch)
+            count_inserted += len(batch)
+
+    elapsed = time.perf_counter() - started
 
     print(f"   ✔ Inserted: {count_inserted}")
     print(f"   ⚠ Skipped : {count_skipped}")
+    print(f"   ⏱ {elapsed:.2f}s ({count_inserted / max(elapsed, 1e-9):.0f} rows/sec, {LOAD_MODE})")
 
     total_inserted += count_inserted
     total_skipped += count_skipped
@@ -148,4 +251,5 @@ print("===============================================")
 print(f"Total JSON files processed: {len(json_files)}")
 print(f"Total rows inserted:        {total_inserted}")
 print(f"Total rows skipped:         {total_skipped}")
+print(f"SQL pool ({SQL_DRIVER}):       {pool_metrics.summary()}")
 print("===============================================")
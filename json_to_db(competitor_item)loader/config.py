@@ -0,0 +1,16 @@
+# config.py
+
+import os
+import sys
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# sql_engine.py lives at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Engine, pool metrics and connection helpers are shared by every
+# pipeline (see sql_engine.py)
+from sql_engine import (
+    SQL_DRIVER, STREAM_BATCH_SIZE, pool_metrics, get_engine, connect, begin,
+)
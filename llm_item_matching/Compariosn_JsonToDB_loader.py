@@ -1,30 +1,19 @@
-import json
 import os
-from sqlalchemy import create_engine, text
-from dotenv import load_dotenv
+import sys
+from sqlalchemy import text
 
-load_dotenv()
-
-# ---------------------------------------------------------
-# SQL CONNECTION
-# ---------------------------------------------------------
-server = os.getenv("AZURE_SQL_SERVER")
-database = os.getenv("AZURE_SQL_DATABASE")
-username = os.getenv("AZURE_SQL_USERNAME")
-password = os.getenv("AZURE_SQL_PASSWORD")
-
-connection_string = f"mssql+pymssql://{username}:{password}@{server}/{database}"
-engine = create_engine(connection_string)
+# Shared pooled engine (driver, pool sizing, pre-ping: see config.py)
+from config import begin, pool_metrics, merge_rows, delete_keys
+from result_writer import iter_results
 
 # Folder containing final matching output JSONs
 MATCH_FOLDER = os.path.join(os.path.dirname(__file__),"llm_mapping_output_json")
 
-json_files = [
-    f for f in os.listdir(MATCH_FOLDER)
-    if f.lower().endswith(".json")
-]
+TARGET_TABLE = "dbo.llm_competitor_price_comparison"
 
-print(f"📁 Found {len(json_files)} match JSON files.\n")
+# "upsert" (default): MERGE through a temp table, re-runs never duplicate.
+# "insert": the old blind INSERT of every row.
+LOAD_MODE = os.getenv("COMPARISON_LOAD_MODE", "upsert")
 
 
 # ---------------------------------------------------------
@@ -84,6 +73,33 @@ VALUES (
 """)
 
 
+COLUMNS = [
+    "gate_item_row_id",
+    "gate_item_name",
+    "gate_item_onboard_name",
+    "competitor_item_id",
+    "competitor_name",
+    "competitor_item_name",
+    "gate_item_description",
+    "gate_parent_category",
+    "gate_sales_category",
+    "competitor_item_description",
+    "competitor_parent_category",
+    "competitor_sales_category",
+    "competitor_item_price",
+    "competitor_item_currency",
+    "competitor_item_brand",
+    "competitor_item_quantity",
+    "competitor_catalog_name",
+    "competitor_catalog_start",
+    "competitor_catalog_end",
+    "competitor_catalog_page",
+    "similarity_score",
+    "reasoning",
+    "tags",
+]
+
+
 # ---------------------------------------------------------
 # SAFE MATCH VALIDATION
 # ---------------------------------------------------------
@@ -103,60 +119,106 @@ def is_valid_match(m):
 
 
 # ---------------------------------------------------------
-# PROCESS FILES
+# ROW MAPPING
 # ---------------------------------------------------------
-total_inserted = 0
+def build_rows(blocks):
+    """Flatten result_builder blocks into one table row per valid match."""
+    for block in blocks:
+
+        gg = block["gate_item"]
+
+        for m in block.get("matches", []):
+
+            # ❗ SKIP invalid match items
+            if not is_valid_match(m):
+                continue
+
+            yield {
+                "gate_item_row_id": gg["id"],
+                "gate_item_name": gg["name"],
+                "gate_item_onboard_name": gg.get("item_onboard_name"),
+                "gate_item_description": gg.get("desc"),
+                "gate_parent_category": gg.get("parent_category"),
+                "gate_sales_category": gg.get("sales_category"),
+
+                "competitor_item_id": m["competitor_item_id"],
+                "competitor_item_name": m["competitor_item_name"],
+                "competitor_item_brand": m.get("brand"),
+                "competitor_item_quantity": m.get("quantity"),
+                "competitor_item_description": m.get("competitor_description"),
+                "competitor_parent_category": m.get("parent_category"),
+                "competitor_sales_category": m.get("sales_category"),
+
+                "competitor_item_price": m.get("price"),
+                "competitor_item_currency": m.get("currency"),
+
+                "competitor_name": m.get("competitor_name"),
+                "competitor_catalog_name": m.get("catalog_name"),
+                "competitor_catalog_start": m.get("catalog_start"),
+                "competitor_catalog_end": m.get("catalog_end"),
+                "competitor_catalog_page": m.get("competitor_page"),
+
+            
+                "similarity_score": m["similarity_final"],
+                "reasoning": m.get("reasoning"),
+                "tags": m.get("tags")
+            }
 
-for jf in json_files:
-    print(f"➡ Processing {jf}")
-    path = os.path.join(MATCH_FOLDER, jf)
 
-    with open(path, "r", encoding="utf-8") as f:
-        blocks = json.load(f)
+# ---------------------------------------------------------
+# LOADING (set-based MERGE: see sql_engine.py)
+# ---------------------------------------------------------
+def upsert_rows(conn, rows):
+    """MERGE rows into TARGET_TABLE. Returns (inserted, updated)."""
+    return merge_rows(conn, TARGET_TABLE, COLUMNS, rows)
+
+
+def delete_rows(conn, keys):
+    """Delete retracted matches, given as sql_engine.match_key() tuples."""
+    return delete_keys(conn, TARGET_TABLE, keys)
+
+
+def insert_rows(conn, rows):
+    if rows:
+        conn.execute(insert_sql, rows)
+    return len(rows), 0
 
-    with engine.begin() as conn:
-        for block in blocks:
 
-            gg = block["gate_item"]
+# ---------------------------------------------------------
+# PROCESS FILES
+# ---------------------------------------------------------
+def load_file(path, mode=LOAD_MODE):
+    # .json arrays or .jsonl files (one result block per line)
+    rows = list(build_rows(iter_results(path)))
+
+    with begin() as conn:
+        if mode == "insert":
+            return insert_rows(conn, rows)
+        return upsert_rows(conn, rows)
 
-            for m in block.get("matches", []):
 
-                # ❗ SKIP invalid match items
-                if not is_valid_match(m):
-                    continue
+def main(mode=LOAD_MODE):
+    json_files = [
+        f for f in os.listdir(MATCH_FOLDER)
+        if f.lower().endswith((".json", ".jsonl"))
+    ]
 
-                row = {
-                    "gate_item_row_id": gg["id"],
-                    "gate_item_name": gg["name"],
-                    "gate_item_onboard_name": gg.get("item_onboard_name"),
-                    "gate_item_description": gg.get("desc"),
-                    "gate_parent_category": gg.get("parent_category"),
-                    "gate_sales_category": gg.get("sales_category"),
+    print(f"📁 Found {len(json_files)} match JSON files ({mode} mode).\n")
 
-                    "competitor_item_id": m["competitor_item_id"],
-                    "competitor_item_name": m["competitor_item_name"],
-                    "competitor_item_brand": m.get("brand"),
-                    "competitor_item_quantity": m.get("quantity"),
-                    "competitor_item_description": m.get("competitor_description"),
-                    "competitor_parent_category": m.get("parent_category"),
-                    "competitor_sales_category": m.get("sales_category"),
+    total_inserted = 0
+    total_updated = 0
 
-                    "competitor_item_price": m.get("price"),
-                    "competitor_item_currency": m.get("currency"),
+    for jf in json_files:
+        print(f"➡ Processing {jf}")
+        inserted, updated = load_file(os.path.join(MATCH_FOLDER, jf), mode)
+        print(f"   ✔ Inserted: {inserted} | Updated: {updated}")
 
-                    "competitor_name": m.get("competitor_name"),
-                    "competitor_catalog_name": m.get("catalog_name"),
-                    "competitor_catalog_start": m.get("catalog_start"),
-                    "competitor_catalog_end": m.get("catalog_end"),
-                    "competitor_catalog_page": m.get("competitor_page"),
+        total_inserted += inserted
+        total_updated += updated
 
-                
-                    "similarity_score": m["similarity_final"],
-                    "reasoning": m.get("reasoning"),
-                    "tags": m.get("tags")
-                }
+    print(f"\n✅ Total Rows Inserted: {total_inserted} | Updated: {total_updated}")
+    print(f"🔌 SQL pool: {pool_metrics.summary()}")
 
-                conn.execute(insert_sql, row)
-                total_inserted += 1
 
-print(f"\n✅ Total Rows Inserted: {total_inserted}")
+if __name__ == "__main__":
+    main("insert" if "--insert" in sys.argv else LOAD_MODE)
@@ -0,0 +1,118 @@
+# batch_journal.py
+
+import os
+import json
+import hashlib
+import threading
+
+JOURNAL_DIR = "llm_mapping_journal"
+
+
+# ---------------------------------------------------------
+# APPEND-ONLY BATCH JOURNAL (one JSONL file per category group)
+# ---------------------------------------------------------
+class BatchJournal:
+    """Durable record of finished LLM batches, so runs can resume.
+
+    Every completed (or finally failed) batch is appended as one JSON
+    line as soon as it finishes. On restart, completed batches are served
+    from the journal and only missing or failed ones hit the LLM again.
+    Once a group has run without failures the journal is rotated, so it
+    never outlives the run it checkpoints.
+    """
+
+    def __init__(self, group_name, journal_dir=JOURNAL_DIR):
+        os.makedirs(journal_dir, exist_ok=True)
+        self.group_name = group_name
+        self.path = os.path.join(journal_dir, f"{group_name}.jsonl")
+        self.lock = threading.Lock()
+        self.completed = {}   # key → LLM "items" list
+        self.splits = {}      # key → keys of the halves it was split into
+        self.failed = {}      # key → last error
+        self.failed_this_run = set()
+        self._load()
+
+    def _load(self):
+        if not os.path.exists(self.path):
+            return
+
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # torn last line from an interrupted run
+
+                if entry["status"] == "done":
+                    self.completed[entry["key"]] = entry["items"]
+                    self.failed.pop(entry["key"], None)
+                elif entry["status"] == "split":
+                    self.splits[entry["key"]] = entry["parts"]
+                    self.failed.pop(entry["key"], None)
+                elif entry["key"] not in self.completed:
+                    self.failed[entry["key"]] = entry.get("error")
+
+    def make_key(self, gg_ids, comp_ids, prompt_hash):
+        raw = json.dumps([self.group_name, list(gg_ids), list(comp_ids), prompt_hash])
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def get(self, key):
+        """Items of a finished batch; a split batch resolves to its halves'
+        items once every half is done (None until then)."""
+        if key in self.completed:
+            return self.completed[key]
+        if key not in self.splits:
+            return None
+
+        items = []
+        for part in self.splits[key]:
+            part_items = self.get(part)
+            if part_items is None:
+                return None
+            items.extend(part_items)
+        return items
+
+    def _append(self, entry):
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        with self.lock:
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+                f.flush()
+                os.fsync(f.fileno())
+
+    def record(self, key, gg_ids, comp_ids, items):
+        self._append({"key": key, "status": "done", "gg_ids": gg_ids,
+                      "comp_ids": comp_ids, "items": items})
+        self.completed[key] = items
+        self.failed.pop(key, None)
+
+    def record_split(self, key, gg_ids, comp_ids, parts):
+        """Mark a batch as answered by its halves; the items stay in the
+        halves' own entries, so nothing is journaled twice."""
+        self._append({"key": key, "status": "split", "gg_ids": gg_ids,
+                      "comp_ids": comp_ids, "parts": parts})
+        self.splits[key] = parts
+        self.failed.pop(key, None)
+
+    def record_failure(self, key, gg_ids, comp_ids, error):
+        self._append({"key": key, "status": "failed", "gg_ids": gg_ids,
+                      "comp_ids": comp_ids, "error": str(error)})
+        self.failed[key] = str(error)
+        self.failed_this_run.add(key)
+
+    def completed_outputs(self, keys):
+        """Finished outputs of the batches in `keys` (the current job plan),
+        in plan order; entries from older plans are ignored."""
+        outputs = (self.get(key) for key in keys)
+        return [items for items in outputs if items is not None]
+
+    def rotate(self):
+        """Move the journal aside (<group>.jsonl.1, replacing the previous
+        one) and start empty; call once the group's output is written."""
+        with self.lock:
+            if os.path.exists(self.path):
+                os.replace(self.path, f"{self.path}.1")
+        self.completed.clear()
+        self.splits.clear()
+        self.failed.clear()
+        self.failed_this_run.clear()
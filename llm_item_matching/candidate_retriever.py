@@ -0,0 +1,86 @@
+# candidate_retriever.py
+
+import re
+import math
+import unicodedata
+from collections import Counter, defaultdict
+
+# Name tokens count more than description tokens
+NAME_WEIGHT = 2.0
+DESC_WEIGHT = 1.0
+
+
+# ---------------------------------------------------------
+# TEXT FEATURES
+# ---------------------------------------------------------
+def normalize_text(text):
+    """Lowercase and strip accents (é → e, ü → u)."""
+    text = unicodedata.normalize("NFKD", text or "")
+    return "".join(ch for ch in text if not unicodedata.combining(ch)).lower()
+
+
+def features(text):
+    """Word tokens plus character trigrams, so 'prosecco' ≈ 'proseco'."""
+    feats = []
+    for word in re.findall(r"[a-z0-9]+", normalize_text(text)):
+        feats.append(word)
+        if len(word) > 3:
+            padded = f"#{word}#"
+            feats.extend(padded[i:i + 3] for i in range(len(padded) - 2))
+    return feats
+
+
+def weighted_features(name_text, desc_text):
+    counts = Counter()
+    for f in features(name_text):
+        counts[f] += NAME_WEIGHT
+    for f in features(desc_text):
+        counts[f] += DESC_WEIGHT
+    return counts
+
+
+def gg_features(g):
+    return weighted_features(f"{g['name']} {g['onboard_name']}", g["desc"])
+
+
+def comp_features(c):
+    return weighted_features(f"{c['brand']} {c['name']} {c['qty']}", c["desc"])
+
+
+# ---------------------------------------------------------
+# TF-IDF INVERTED INDEX
+# ---------------------------------------------------------
+class LexicalIndex:
+    """Sparse TF-IDF cosine search over competitor items."""
+
+    def __init__(self, docs):
+        self.size = len(docs)
+
+        df = Counter()
+        for doc in docs:
+            df.update(doc.keys())
+        self.idf = {f: math.log((1 + self.size) / (1 + n)) + 1 for f, n in df.items()}
+
+        self.postings = defaultdict(list)
+        for doc_id, doc in enumerate(docs):
+            vec = self.vectorize(doc)
+            for f, w in vec.items():
+                self.postings[f].append((doc_id, w))
+
+    def vectorize(self, counts):
+        vec = {f: (1 + math.log(c)) * self.idf[f] for f, c in counts.items() if f in self.idf}
+        norm = math.sqrt(sum(w * w for w in vec.values()))
+        return {f: w / norm for f, w in vec.items()} if norm else {}
+
+    def search(self, counts, k):
+        scores = defaultdict(float)
+        for f, qw in self.vectorize(counts).items():
+            for doc_id, dw in self.postings[f]:
+                scores[doc_id] += qw * dw
+        return sorted(scores, key=lambda d: (-scores[d], d))[:k]
+
+
+def retrieve_candidates(gg_minimal, comp_minimal, k):
+    """Return {gg_id: [competitor index, ...]} with the top-k candidates."""
+    index = LexicalIndex([comp_features(c) for c in comp_minimal])
+    return {g["id"]: index.search(gg_features(g), k) for g in gg_minimal}
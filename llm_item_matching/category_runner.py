@@ -1,9 +1,16 @@
 # category_runner.py
 import os
-import json
+import sys
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from db_loader import load_gate_group_items, load_competitor_items
-from llm_matcher import match_all_items_llm
-from result_builder import build_final_results
+from llm_client import MAX_CONCURRENT_CALLS
+from config import pool_metrics
+from llm_matcher import match_all_items_llm, journaled_results
+from batch_journal import BatchJournal
+from result_builder import iter_final_results
+from result_sink import open_sink, RESULT_SINK
+import Compariosn_JsonToDB_loader as comparison_loader
 
 # ---------------------------------------------------------
 # DEFINE CATEGORY GROUPS
@@ -35,60 +42,110 @@ CATEGORY_GROUPS = {
 os.makedirs("llm_mapping_output_json", exist_ok=True)
 
 # ---------------------------------------------------------
-# CATEGORY FILTER HELPERS
+# PER-GROUP LOADING (filtered in SQL, see ddl/*_by_category.sql)
 # ---------------------------------------------------------
-def filter_gg_items(gg_items, categories):
-    return [
-        g for g in gg_items
-        if getattr(g, "item_sales_category_name", None) in categories
-    ]
-
-def filter_comp_items(comp_items, categories):
-    return [
-        c for c in comp_items
-        if getattr(c, "sales_category", None) in categories
-    ]
+# Groups fetch their own slices; at most this many query the database at
+# once (1 = one group after another).
+FETCH_CONCURRENCY = int(os.getenv("CATEGORY_FETCH_CONCURRENCY", "4"))
+fetch_slots = threading.BoundedSemaphore(FETCH_CONCURRENCY)
+
+
+def load_group_items(group_name, categories):
+    with fetch_slots:
+        gg = load_gate_group_items(categories)
+        comp = load_competitor_items(categories)
+
+    print(f"🔍 {group_name} ({categories}): {len(gg)} GG items, {len(comp)} COMP items")
+    return gg, comp
 
 # ---------------------------------------------------------
-# MAIN CATEGORY RUNNER
+# SINGLE CATEGORY GROUP
 # ---------------------------------------------------------
-def run_category_matching():
-    print("Loading FULL GG list...")
-    gg_all = load_gate_group_items()
+def write_group_output(group_name, llm_raw, gg, comp):
+    # Enriched blocks are streamed to the sink(s) one by one:
+    # RESULT_SINK=json|jsonl|sql or a mix, e.g. "jsonl,sql"
+    with open_sink(RESULT_SINK, f"llm_mapping_output_json/llm_results_{group_name}",
+                   loader=comparison_loader) as sink:
+        sink.write_all(iter_final_results(llm_raw, gg, comp))
 
-    print("Loading FULL competitor list...")
-    comp_all = load_competitor_items()
+    return sink.target
 
-    print(f"Total GG items loaded   : {len(gg_all)}")
-    print(f"Total COMP items loaded : {len(comp_all)}\n")
 
-    for group_name, categories in CATEGORY_GROUPS.items():
-        print("\n====================================================")
-        print(f"🔍 CATEGORY GROUP → {group_name} ({categories})")
-        print("====================================================")
+def run_group(group_name, categories, executor):
+    gg, comp = load_group_items(group_name, categories)
+
+    if len(gg) == 0 or len(comp) == 0:
+        print(f"⚠ {group_name}: Skipping — empty category data.")
+        return None
+
+    # Completed batches are checkpointed here; a rerun after a crash
+    # only sends the batches that are missing or failed.
+    journal = BatchJournal(group_name)
+
+    llm_raw = match_all_items_llm(gg, comp, executor=executor, journal=journal)
+    output_path = write_group_output(group_name, llm_raw, gg, comp)
 
-        gg = filter_gg_items(gg_all, categories)
-        comp = filter_comp_items(comp_all, categories)
+    # Output is written: only a run with failed batches keeps its journal
+    # (so the rerun resumes); otherwise it must not serve the next run.
+    if not journal.failed_this_run:
+        journal.rotate()
 
-        print(f"✔ Filtered GG items: {len(gg)}")
-        print(f"✔ Filtered COMP items: {len(comp)}")
+    print(f"✅ {group_name}: Saved {output_path}")
+    return output_path
 
-        if len(gg) == 0 or len(comp) == 0:
-            print("⚠ Skipping — empty category data.")
-            continue
 
-        print("➡ Running LLM matching...")
-        llm_raw = match_all_items_llm(gg, comp)
+def flush_partial_group(group_name, categories):
+    """Write a group's output from the batches journaled so far (no LLM calls)."""
+    journal = BatchJournal(group_name)
+    if not journal.completed:
+        print(f"⚠ {group_name}: Nothing journaled yet.")
+        return None
 
-        print("➡ Building final enriched results...")
-        final_result = build_final_results(llm_raw, gg, comp)
+    gg, comp = load_group_items(group_name, categories)
 
-        output_path = f"llm_mapping_output_json/llm_results_{group_name}.json"
-        with open(output_path, "w", encoding="utf-8") as f:
-            json.dump(final_result, f, indent=2, ensure_ascii=False)
+    # Only batches of the current plan count; the journal may also hold
+    # entries for items or prompts that have changed since
+    llm_raw, journaled, planned = journaled_results(gg, comp, journal)
+    output_path = write_group_output(group_name, llm_raw, gg, comp)
+
+    print(f"📝 {group_name}: Partial output ({journaled}/{planned} batches) → {output_path}")
+    return output_path
+
+
+# ---------------------------------------------------------
+# MAIN CATEGORY RUNNER
+# ---------------------------------------------------------
+def run_category_matching(flush_partial=False):
+    if flush_partial:
+        for group_name, categories in CATEGORY_GROUPS.items():
+            flush_partial_group(group_name, categories)
+        return
+
+    # Every group's LLM batches share one pool, so the global concurrency
+    # and TPM budget in llm_client applies across all groups at once.
+    with ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CALLS) as batch_executor, \
+            ThreadPoolExecutor(max_workers=max(1, len(CATEGORY_GROUPS))) as group_executor:
+
+        futures = {
+            group_name: group_executor.submit(
+                run_group, group_name, categories, batch_executor
+            )
+            for group_name, categories in CATEGORY_GROUPS.items()
+        }
+
+        print("\n====================================================")
+        for group_name, future in futures.items():
+            try:
+                output_path = future.result()
+                status = output_path or "skipped (empty)"
+            except Exception as e:
+                status = f"FAILED: {e}"
+            print(f"{group_name:<20} → {status}")
+        print("====================================================")
 
-        print(f"✅ Saved: {output_path}")
+    print(f"🔌 SQL pool: {pool_metrics.summary()}")
 
 
 if __name__ == "__main__":
-    run_category_matching()
+    # --flush-partial: rebuild each group's JSON from the journal only
+    run_category_matching(flush_partial="--flush-partial" in sys.argv)
@@ -1,35 +1,45 @@
 # config.py
 
 import os
-from sqlalchemy import create_engine, text
+import sys
+import logging
 from dotenv import load_dotenv
-from openai import AzureOpenAI
 
 load_dotenv()
 
+# sql_engine.py lives at the repository root
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 
-def get_sql_engine():
-    """Creates SQLAlchemy engine for Azure SQL."""
-    server = os.getenv("AZURE_SQL_SERVER")
-    database = os.getenv("AZURE_SQL_DATABASE")
-    username = os.getenv("AZURE_SQL_USERNAME")
-    password = os.getenv("AZURE_SQL_PASSWORD")
+# Engine, pool metrics and connection helpers are shared by every
+# pipeline (see sql_engine.py)
+from sql_engine import (
+    SQL_DRIVER, STREAM_BATCH_SIZE, OFFLINE_SQLITE, pool_metrics,
+    get_engine, shared, connect, begin, stream_rows, merge_rows, delete_keys,
+)
 
-    conn_str = f"mssql+pymssql://{username}:{password}@{server}/{database}"
-    engine = create_engine(conn_str)
-
-    # test connection
-    with engine.connect() as conn:
-        conn.execute(text("SELECT 1"))
-
-    return engine
+# The shared root modules (sql_engine.py, result_sink.py) log to the
+# "pipeline" logger; show their messages as plain lines, like this
+# package's own print() output
+pipeline_logger = logging.getLogger("pipeline")
+if not pipeline_logger.handlers:
+    handler = logging.StreamHandler(sys.stdout)
+    handler.setFormatter(logging.Formatter("%(message)s"))
+    pipeline_logger.addHandler(handler)
+    pipeline_logger.setLevel(logging.INFO)
+    pipeline_logger.propagate = False
 
 
 def get_llm_client():
     """Initialize Azure OpenAI client."""
+    # Imported here: the openai package alone costs noticeable startup time
+    from openai import AzureOpenAI
+
     client = AzureOpenAI(
         api_key=os.getenv("AZURE_OPENAI_API_KEY"),
         azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
         api_version="2024-02-15-preview",
     )
     return client
+
+
+get_client = shared(get_llm_client)
@@ -1,15 +1,45 @@
 # db_loader.py
 
 import os
-from sqlalchemy import text
-from config import get_sql_engine
-
-engine = get_sql_engine()
+from itertools import islice
+from sqlalchemy import text, bindparam
+from config import stream_rows, STREAM_BATCH_SIZE
 
 BASE_DIR = os.path.dirname(__file__)
 DDL_DIR = os.path.join(BASE_DIR, "ddl")
 
 
+# ---------------------------------------------------------
+# COMPACT ROW RECORDS
+# ---------------------------------------------------------
+class Record:
+    """Fixed-attribute row copy (__slots__: no per-row dict, no Row object).
+
+    Columns missing from the query are None, so getattr() checks keep working.
+    """
+    __slots__ = ()
+
+    def __init__(self, row):
+        mapping = row._mapping
+        for name in self.__slots__:
+            setattr(self, name, mapping.get(name))
+
+
+class GateItem(Record):
+    __slots__ = (
+        "item_row_id", "item_name", "item_onboard_name", "item_description",
+        "item_parent_sales_category_name", "item_sales_category_name",
+    )
+
+
+class CompetitorItem(Record):
+    __slots__ = (
+        "item_id", "brand", "item_name", "quantity", "item_description",
+        "parent_category", "sales_category", "price", "currency",
+        "competitor_name", "catalog_name", "catalog_start", "catalog_end", "page",
+    )
+
+
 def load_sql_file(filename):
     """Load SQL content from /ddl without modifying it."""
     path = os.path.join(DDL_DIR, filename)
@@ -17,18 +47,43 @@ def load_sql_file(filename):
         return f.read()
 
 
-def execute_sql_file(filename):
+def sql_file_query(filename, params):
+    sql = text(load_sql_file(filename))
+    # List-valued parameters (e.g. :categories) expand to IN (?, ?, ...)
+    expanding = [bindparam(k, expanding=True) for k, v in params.items() if isinstance(v, (list, tuple))]
+    return sql.bindparams(*expanding) if expanding else sql
+
+
+def iter_sql_file(filename, record_type, params=None, chunk_size=STREAM_BATCH_SIZE):
+    """Stream the rows of a .sql file as lists of `record_type`, one chunk
+    at a time, while the query is still being fetched."""
+    params = params or {}
+    sql = sql_file_query(filename, params)
+    rows = (record_type(r) for r in stream_rows(sql, params, batch_size=chunk_size))
+    while True:
+        chunk = list(islice(rows, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def execute_sql_file(filename, record_type, params=None):
     """Execute raw SQL exactly as written in the .sql file."""
-    sql = load_sql_file(filename)
-    with engine.connect() as conn:
-        return conn.execute(text(sql)).fetchall()
+    return [r for chunk in iter_sql_file(filename, record_type, params) for r in chunk]
 
 
-def load_gate_group_items():
-    """Load GG items using pure SQL from ddl/gate_items.sql."""
-    return execute_sql_file("gate_items.sql")
+def load_gate_group_items(categories=None):
+    """Load GG items using pure SQL from ddl/gate_items.sql, or only the
+    given sales categories (filtered server-side) from
+    ddl/gate_items_by_category.sql."""
+    if categories:
+        return execute_sql_file("gate_items_by_category.sql", GateItem, {"categories": list(categories)})
+    return execute_sql_file("gate_items.sql", GateItem)
 
 
-def load_competitor_items():
-    """Load competitor items using pure SQL from ddl/competitor_items.sql."""
-    return execute_sql_file("competitor_items.sql")
+def load_competitor_items(categories=None):
+    """Load competitor items using pure SQL from ddl/competitor_items.sql,
+    or only the given sales categories from ddl/competitor_items_by_category.sql."""
+    if categories:
+        return execute_sql_file("competitor_items_by_category.sql", CompetitorItem, {"categories": list(categories)})
+    return execute_sql_file("competitor_items.sql", CompetitorItem)
@@ -0,0 +1,15 @@
+-- Recommended covering indexes for the per-category loaders
+-- (gate_items_by_category.sql / competitor_items_by_category.sql).
+-- The key is the filtered category; the INCLUDE list covers every selected
+-- column, so a category slice is an index seek with no key lookups.
+
+CREATE NONCLUSTERED INDEX ix_item_sales_category
+    ON dbo.item (item_sales_category_name)
+    INCLUDE (item_row_id, item_name, item_onboard_name, item_description,
+             item_parent_sales_category_name);
+
+CREATE NONCLUSTERED INDEX ix_competitor_item_details_sales_category
+    ON dbo.competitor_item_details (sales_category)
+    INCLUDE (item_id, brand, item_name, quantity, item_description,
+             parent_category, price, currency, competitor_name,
+             catalog_name, catalog_start, catalog_end, page);
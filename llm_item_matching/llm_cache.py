@@ -0,0 +1,121 @@
+# llm_cache.py
+
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+CACHE_PATH = os.getenv("LLM_CACHE_PATH", "llm_response_cache.sqlite")
+# "on" (read + write), "off" (bypass entirely), "refresh" (ignore hits, overwrite)
+CACHE_MODE = os.getenv("LLM_CACHE_MODE", "on").lower()
+CACHE_MAX_MB = float(os.getenv("LLM_CACHE_MAX_MB", "500"))
+CACHE_TTL_DAYS = float(os.getenv("LLM_CACHE_TTL_DAYS", "30"))  # 0 = never expire
+
+
+def sha256(text):
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+# ---------------------------------------------------------
+# PERSISTENT LLM RESPONSE MEMO (SQLite, LRU + TTL)
+# ---------------------------------------------------------
+class LLMCache:
+    """Raw LLM responses keyed by everything that changes the answer.
+
+    Entries older than the TTL are treated as misses; once the store
+    grows past the size cap the least recently used entries are evicted.
+    """
+
+    def __init__(self, path=CACHE_PATH, mode=CACHE_MODE,
+                 max_mb=CACHE_MAX_MB, ttl_days=CACHE_TTL_DAYS):
+        self.mode = mode
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.ttl = ttl_days * 86400
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        if mode == "off":
+            self.conn = None
+            return
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS llm_responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                created_at REAL NOT NULL,
+                last_used REAL NOT NULL
+            )
+        """)
+        self.conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_llm_responses_last_used ON llm_responses (last_used)"
+        )
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(system_prompt, payload, model, temperature, response_format):
+        canonical = json.dumps(payload, sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+        return sha256(json.dumps([
+            sha256(system_prompt), sha256(canonical), model, temperature,
+            json.dumps(response_format, sort_keys=True)
+        ]))
+
+    def get(self, key):
+        if self.mode != "on":
+            return None
+
+        now = time.time()
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT response, created_at FROM llm_responses WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row and self.ttl and now - row[1] > self.ttl:
+                self.conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+                self.conn.commit()
+                row = None
+
+            if row:
+                self.conn.execute(
+                    "UPDATE llm_responses SET last_used = ? WHERE key = ?", (now, key)
+                )
+                self.conn.commit()
+                self.hits += 1
+                return row[0]
+
+            self.misses += 1
+        return None
+
+    def put(self, key, response):
+        if self.conn is None or not response:
+            return
+
+        now = time.time()
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO llm_responses VALUES (?, ?, ?, ?, ?)",
+                (key, response, len(response.encode("utf-8")), now, now)
+            )
+            self._evict()
+            self.conn.commit()
+
+    def _evict(self):
+        total = self.conn.execute("SELECT COALESCE(SUM(size), 0) FROM llm_responses").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        # Drop least recently used entries until we are back under the cap
+        for key, size in self.conn.execute(
+            "SELECT key, size FROM llm_responses ORDER BY last_used"
+        ).fetchall():
+            self.conn.execute("DELETE FROM llm_responses WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def stats(self):
+        return f"mode={self.mode} | hits={self.hits} | misses={self.misses}"
@@ -2,31 +2,174 @@
 
 import os
 import json
-from config import get_llm_client
-
-client = get_llm_client()
+import time
+import threading
+from config import get_client, shared
+from token_packer import count_tokens, OUTPUT_TOKEN_BUDGET
+from llm_cache import LLMCache
 
 MODEL = os.getenv("AZURE_OPENAI_DEPLOYMENT", "gpt-4o")
+TEMPERATURE = 0
+RESPONSE_FORMAT = {"type": "json_object"}  # Azure-supported
+
+# Memoized responses: reruns that only change downstream stages
+# (result_builder, output folders) make no LLM calls.
+get_response_cache = shared(LLMCache)
+
+# ---------------------------------------------------------
+# GLOBAL CALL BUDGET (shared by every thread in the process)
+# ---------------------------------------------------------
+MAX_CONCURRENT_CALLS = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+TOKENS_PER_MINUTE = int(os.getenv("AZURE_OPENAI_TPM", "150000"))
+
+
+class TokenBudget:
+    """Thread-safe tokens-per-minute bucket."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount):
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            time.sleep(wait)
+
+    def adjust(self, amount):
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens + amount)
+
+
+call_slots = threading.BoundedSemaphore(MAX_CONCURRENT_CALLS)
+token_budget = TokenBudget(TOKENS_PER_MINUTE)
+
+
+class TruncatedResponseError(ValueError):
+    """The model hit max_tokens before finishing its JSON."""
+
+
+class InvalidResponseError(ValueError):
+    """Valid JSON, but not the shape the caller asked for."""
+
 
+def is_transient(error):
+    """Connection, timeout, rate-limit (429) and server (5xx) errors: the
+    only failures worth repeating unchanged at temperature 0."""
+    from openai import APIConnectionError, RateLimitError, InternalServerError
 
-def call_llm(system_prompt: str, user_payload: dict):
-    """Call Azure LLM enforcing STRICT JSON output."""
+    return isinstance(error, (APIConnectionError, RateLimitError, InternalServerError))
+
+
+# ---------------------------------------------------------
+# TOKEN UTILIZATION
+# ---------------------------------------------------------
+class UsageStats:
+    """Thread-safe totals of what the LLM calls actually used."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+        self.max_output_tokens = 0
+
+    def record(self, prompt_tokens, completion_tokens, max_tokens):
+        with self.lock:
+            self.calls += 1
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+            self.max_output_tokens += max_tokens
+
+    def summary(self):
+        with self.lock:
+            if not self.calls:
+                return "no LLM calls"
+            return (
+                f"{self.calls} calls | prompt {self.prompt_tokens} tok | "
+                f"completion {self.completion_tokens} tok "
+                f"({self.completion_tokens / self.max_output_tokens:.0%} of output budget)"
+            )
+
+
+usage_stats = UsageStats()
+
+
+def call_llm(system_prompt: str, user_payload: dict, max_tokens: int = OUTPUT_TOKEN_BUDGET, validate=None):
+    """Call Azure LLM enforcing STRICT JSON output.
+
+    `validate(result)` raises (ValueError) when the parsed JSON does not
+    have the shape the caller expects; such responses are never cached.
+    """
 
     # IMPORTANT FIX:
     # Use ensure_ascii=False when sending JSON to LLM
     # so characters like “ ’ ” are not escaped as \u2019 
     user_json = json.dumps(user_payload, ensure_ascii=False)
 
-    response = client.chat.completions.create(
-        model=MODEL,
-        temperature=0,
-        response_format={"type": "json_object"},  # Azure-supported
-        messages=[
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": user_json}
-        ]
-    )
+    cache_key = LLMCache.make_key(system_prompt, user_payload, MODEL, TEMPERATURE, RESPONSE_FORMAT)
+    response_cache = get_response_cache()
+    cached = response_cache.get(cache_key)
+    if cached is not None:
+        result = json.loads(cached)
+        try:
+            if validate is not None:
+                validate(result)
+            return result
+        except ValueError:
+            pass  # bad entry from before validation; ask again and replace it
+
+    input_estimate = count_tokens(system_prompt) + count_tokens(user_json)
+    estimate = input_estimate + max_tokens
+    token_budget.acquire(estimate)
+
+    with call_slots:
+        response = get_client().chat.completions.create(
+            model=MODEL,
+            temperature=TEMPERATURE,
+            max_tokens=max_tokens,
+            response_format=RESPONSE_FORMAT,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": user_json}
+            ]
+        )
+
+    if response.usage is not None:
+        token_budget.adjust(estimate - response.usage.total_tokens)
+
+        usage = response.usage
+        usage_stats.record(usage.prompt_tokens, usage.completion_tokens, max_tokens)
+        print(
+            f"🧮 LLM call: prompt {usage.prompt_tokens} tok (est {input_estimate}) | "
+            f"completion {usage.completion_tokens}/{max_tokens} tok "
+            f"({usage.completion_tokens / max_tokens:.0%})"
+        )
+
+    choice = response.choices[0]
+    if choice.finish_reason == "length":
+        raise TruncatedResponseError(f"Response truncated at {max_tokens} tokens")
 
     # IMPORTANT FIX:
     # Ensure LLM output is parsed with UTF-8 characters intact
-    return json.loads(response.choices[0].message.content)
+    result = json.loads(choice.message.content)
+    if validate is not None:
+        validate(result)
+
+    # Only complete, parseable, well-formed responses are memoized
+    response_cache.put(cache_key, choice.message.content)
+    return result
@@ -1,11 +1,34 @@
 # llm_matcher.py
 
+import os
 import json
+import time
+import random
+import hashlib
+from concurrent.futures import ThreadPoolExecutor
 from system_prompt import SYSTEM_PROMPT
-from llm_client import call_llm
+from llm_client import (
+    call_llm, usage_stats, get_response_cache, is_transient, MAX_CONCURRENT_CALLS,
+    TruncatedResponseError, InvalidResponseError
+)
+from candidate_retriever import retrieve_candidates
+from token_packer import pack_gg, pack_comp, split_batch
 
-GG_BATCH_SIZE = 5
-COMP_BATCH_SIZE = 20
+# Batch sizes are no longer fixed: token_packer fills each request up to
+# LLM_INPUT_TOKEN_BUDGET / LLM_OUTPUT_TOKEN_BUDGET.
+
+# Opt-in: send each GG batch only its lexical top-k competitor candidates
+# instead of the full competitor list (0 = send every pair). Check the k
+# with evaluate_candidate_recall() first; pairs outside the top k are
+# never shown to the LLM.
+TOP_K_CANDIDATES = int(os.getenv("LLM_TOP_K_CANDIDATES", "0"))
+
+# A batch failing on transport or rate limits is retried on its own this
+# many times before it is journaled as failed; the rest of the group
+# carries on regardless.
+BATCH_RETRIES = 3
+
+PROMPT_HASH = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()
 
 
 def round_scores(matches):
@@ -26,9 +49,11 @@ def round_scores(matches):
     return matches
 
 
-def batch_list(data, size):
-    for i in range(0, len(data), size):
-        yield data[i:i + size]
+def check_items(response):
+    if not isinstance(response, dict) or "items" not in response:
+        raise InvalidResponseError(
+            f"Invalid LLM output: Expected {{'items': [...]}} but got: {response}"
+        )
 
 
 def match_batch(gate_items_batch, competitor_items_batch):
@@ -37,67 +62,244 @@ def match_batch(gate_items_batch, competitor_items_batch):
         "competitor_items": competitor_items_batch
     }
 
-    response = call_llm(SYSTEM_PROMPT, payload)
+    # Validated inside call_llm, before the response is cached
+    response = call_llm(SYSTEM_PROMPT, payload, validate=check_items)
 
     print("\n================ RAW LLM OUTPUT ================")
     print(json.dumps(response, indent=2, ensure_ascii=False))
     print("================================================\n")
 
-    if not isinstance(response, dict) or "items" not in response:
-        raise ValueError(
-            f"Invalid LLM output: Expected {'items': [...]} but got: {response}"
+    return response["items"]
+
+
+def batch_key(journal, gg_batch, comp_batch):
+    return journal.make_key([g["id"] for g in gg_batch], [c["id"] for c in comp_batch], PROMPT_HASH)
+
+
+def execute_batch(gg_batch, comp_batch, journal=None):
+    """Run one batch, retrying transient (transport / rate-limit) errors
+    in isolation; raises once retries are exhausted. A truncated,
+    unparseable or malformed response splits the batch in half instead
+    of retrying it as-is; any other error is raised at once."""
+    gg_ids = [g["id"] for g in gg_batch]
+    comp_ids = [c["id"] for c in comp_batch]
+    key = batch_key(journal, gg_batch, comp_batch) if journal else None
+
+    if journal is not None:
+        cached = journal.get(key)
+        if cached is not None:
+            return cached
+
+    for attempt in range(1, BATCH_RETRIES + 1):
+        halves = None
+        try:
+            items = match_batch(gg_batch, comp_batch)
+        except (TruncatedResponseError, json.JSONDecodeError, InvalidResponseError) as e:
+            halves = split_batch(gg_batch, comp_batch)
+            if halves is None:
+                raise  # a single pair; temperature 0 would fail the same way
+            print(f"✂ Batch {gg_ids} x {len(comp_ids)} comps: {e}; splitting in two")
+        except Exception as e:
+            if not is_transient(e):
+                raise
+            print(f"⚠ Batch {gg_ids} failed (attempt {attempt}/{BATCH_RETRIES}): {e}")
+            error = e
+            if attempt < BATCH_RETRIES:
+                time.sleep(2 ** attempt)
+            continue
+
+        if halves is not None:
+            items = [r for gb, cb in halves for r in execute_batch(gb, cb, journal)]
+            if journal is not None:
+                # The halves journaled their own items
+                journal.record_split(key, gg_ids, comp_ids, [batch_key(journal, gb, cb) for gb, cb in halves])
+            return items
+
+        if journal is not None:
+            journal.record(key, gg_ids, comp_ids, items)
+        return items
+
+    raise error
+
+
+def run_batch(gg_batch, comp_batch, journal=None):
+    """execute_batch, but with a journal a batch that still fails is
+    recorded and skipped instead of failing the whole group."""
+    try:
+        return execute_batch(gg_batch, comp_batch, journal)
+    except Exception as e:
+        if journal is None:
+            raise
+
+        # Leave it for the next run; the journal only replays "done" batches
+        journal.record_failure(
+            batch_key(journal, gg_batch, comp_batch),
+            [g["id"] for g in gg_batch], [c["id"] for c in comp_batch], e
         )
+        return []
 
-    return response["items"]
 
+def merge_results(gg_minimal, batch_outputs):
+    """Merge LLM batch outputs into one entry per GG item (original GG order)."""
+    merged = {g["id"]: [] for g in gg_minimal}
+
+    for items in batch_outputs:
+        for item_result in items:
+            gg_id = item_result["gate_item_id"]
+            if gg_id not in merged:
+                continue  # unknown / stale id (e.g. from an older journal)
+            matches = round_scores(item_result.get("matches", []))
+            merged[gg_id].extend(matches)
 
-def match_all_items_llm(gg_items, comp_items):
     final_results = []
+    for g in gg_minimal:
+        gg_id = g["id"]
+
+        # NEW RULE: Skip empty match list
+        if not merged[gg_id]:
+            continue
 
-    gg_minimal = [
+        final_results.append({
+            "gate_item": {
+                "id": gg_id,
+                "name": g["name"]
+            },
+            "matches": sorted(
+                merged[gg_id],
+                key=lambda x: float(x["score"]),
+                reverse=True
+            )
+        })
+
+    return final_results
+
+
+def minimal_gg(gg_items):
+    return [
         {"id": g.item_row_id, "name": g.item_name or "", "onboard_name": g.item_onboard_name or "", "desc": g.item_description or ""}
         for g in gg_items
     ]
 
-    comp_minimal = [
+
+def minimal_comp(comp_items):
+    return [
         {"id": c.item_id, "brand": c.brand or "", "name": c.item_name or "",
          "qty": c.quantity or "", "desc": c.item_description or ""}
         for c in comp_items
     ]
 
-    gg_batches = list(batch_list(gg_minimal, GG_BATCH_SIZE))
-    comp_batches = list(batch_list(comp_minimal, COMP_BATCH_SIZE))
 
-    for gg_batch in gg_batches:
+def plan_jobs(gg_minimal, comp_minimal, top_k=TOP_K_CANDIDATES):
+    """Pack GG × competitor items into (gg_batch, comp_batch) LLM jobs.
+    Deterministic for the same inputs, so journal keys line up across runs."""
+    gg_order = gg_minimal
+    candidates = None
+    if top_k:
+        candidates = retrieve_candidates(gg_minimal, comp_minimal, top_k)
+        # Batch GG items that share their best candidate, so each batch's
+        # candidate union (and therefore its LLM calls) stays small
+        gg_order = sorted(gg_minimal, key=lambda g: candidates[g["id"]][:1])
+
+    gg_batches = pack_gg(gg_order)
 
-        merged = {g["id"]: [] for g in gg_batch}
+    jobs = []
+    for gg_batch in gg_batches:
+        if candidates is not None:
+            # Union of this batch's candidates, in competitor list order
+            union = sorted({i for g in gg_batch for i in candidates[g["id"]]})
+            comp_batches = pack_comp([comp_minimal[i] for i in union], gg_batch)
+        else:
+            comp_batches = pack_comp(comp_minimal, gg_batch)
 
         for comp_batch in comp_batches:
-            batch_output = match_batch(gg_batch, comp_batch)
-
-            for item_result in batch_output:
-                gg_id = item_result["gate_item_id"]
-                matches = round_scores(item_result.get("matches", []))
-                merged[gg_id].extend(matches)
-
-        # ----------- FINAL MERGE -----------
-        for g in gg_batch:
-            gg_id = g["id"]
-
-            # NEW RULE: Skip empty match list
-            if not merged[gg_id]:
-                continue
-
-            final_results.append({
-                "gate_item": {
-                    "id": gg_id,
-                    "name": g["name"]
-                },
-                "matches": sorted(
-                    merged[gg_id],
-                    key=lambda x: float(x["score"]),
-                    reverse=True
-                )
-            })
+            jobs.append((gg_batch, comp_batch))
+
+    return jobs
+
+
+def match_all_items_llm(gg_items, comp_items, executor=None, journal=None, top_k=TOP_K_CANDIDATES):
+    """Match GG items against competitor items with the LLM.
+
+    Batches run concurrently on `executor` (a shared pool lets several
+    category groups fan out under the same budget); results are merged
+    in submission order, so the output is deterministic.
+
+    With a `journal` (see batch_journal.BatchJournal), finished batches
+    are checkpointed as they complete and skipped on the next run.
+    """
+    gg_minimal = minimal_gg(gg_items)
+    comp_minimal = minimal_comp(comp_items)
+
+    # ----------- PLAN ALL BATCHES -----------
+    jobs = plan_jobs(gg_minimal, comp_minimal, top_k)
+
+    llm_calls = len(jobs)
+    pairs_sent = sum(len(gb) * len(cb) for gb, cb in jobs)
+    resumed = 0
+    if journal is not None:
+        resumed = sum(journal.get(batch_key(journal, gb, cb)) is not None for gb, cb in jobs)
+
+    # ----------- RUN CONCURRENTLY -----------
+    own_executor = executor is None
+    if own_executor:
+        executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_CALLS)
+
+    try:
+        futures = [executor.submit(run_batch, gg_batch, comp_batch, journal) for gg_batch, comp_batch in jobs]
+        final_results = merge_results(gg_minimal, (future.result() for future in futures))
+
+    finally:
+        if own_executor:
+            executor.shutdown(wait=True, cancel_futures=True)
+
+    total_pairs = len(gg_minimal) * len(comp_minimal)
+    if total_pairs:
+        print(
+            f"📉 LLM calls: {llm_calls} | pairs sent: {pairs_sent}/{total_pairs} "
+            f"({1 - pairs_sent / total_pairs:.1%} pruned)"
+        )
+    print(f"🧮 Token usage so far: {usage_stats.summary()}")
+    print(f"💾 LLM response cache: {get_response_cache().stats()}")
+    if journal is not None:
+        failed = sum(batch_key(journal, gb, cb) in journal.failed for gb, cb in jobs)
+        print(f"📒 Journal {journal.path}: {resumed} batches resumed, {failed} failed (rerun to retry)")
 
     return final_results
+
+
+def journaled_results(gg_items, comp_items, journal, top_k=TOP_K_CANDIDATES):
+    """Merge what `journal` holds for the current job plan (no LLM calls).
+    Returns (results, journaled batches, planned batches)."""
+    gg_minimal = minimal_gg(gg_items)
+    jobs = plan_jobs(gg_minimal, minimal_comp(comp_items), top_k)
+    outputs = journal.completed_outputs([batch_key(journal, gb, cb) for gb, cb in jobs])
+    return merge_results(gg_minimal, outputs), len(outputs), len(jobs)
+
+
+def evaluate_candidate_recall(gg_items, comp_items, ks=(5, 10, 15, 25, 50), sample=20, seed=0):
+    """Print recall@k of the lexical prefilter on a sample of GG items.
+
+    The sample is matched against the full competitor list (every pair is
+    sent to the LLM); recall@k is the share of those matches whose
+    competitor is among the GG item's top-k candidates.
+    """
+    sampled = random.Random(seed).sample(list(gg_items), min(sample, len(gg_items)))
+    results = match_all_items_llm(sampled, comp_items, top_k=0)
+
+    comp_minimal = minimal_comp(comp_items)
+    candidates = retrieve_candidates(minimal_gg(sampled), comp_minimal, max(ks))
+    candidate_ids = {
+        gg_id: [comp_minimal[i]["id"] for i in ids] for gg_id, ids in candidates.items()
+    }
+
+    matched = [
+        (row["gate_item"]["id"], m["competitor_item_id"])
+        for row in results for m in row["matches"]
+    ]
+    report = {}
+    for k in ks:
+        found = sum(comp_id in candidate_ids[gg_id][:k] for gg_id, comp_id in matched)
+        report[k] = found / len(matched) if matched else 1.0
+        print(f"🎯 Candidate recall@{k}: {report[k]:.3f} ({found}/{len(matched)} LLM matches)")
+
+    return report
@@ -1,48 +1,58 @@
-def build_final_results(llm_results, gg_items, comp_items):
-    gg_lookup = {
-        g.item_row_id: {
-            "id": g.item_row_id,
-            "name": g.item_name,
-            "item_onboard_name": getattr(g, "item_onboard_name", None),
-            "desc": g.item_description,
-            "parent_category": getattr(g, "item_parent_sales_category_name", None),
-            "sales_category": getattr(g, "item_sales_category_name", None)
-        }
-        for g in gg_items
+def gg_details(g):
+    return {
+        "id": g.item_row_id,
+        "name": g.item_name,
+        "item_onboard_name": getattr(g, "item_onboard_name", None),
+        "desc": g.item_description,
+        "parent_category": getattr(g, "item_parent_sales_category_name", None),
+        "sales_category": getattr(g, "item_sales_category_name", None)
     }
 
-    comp_lookup = {
-        c.item_id: {
-            "id": c.item_id,
-            "brand": c.brand,
-            "name": c.item_name,
-            "quantity": c.quantity,
-            "desc": c.item_description,
-            "parent_category": c.parent_category,
-            "sales_category": c.sales_category,
-            "price": float(c.price) if c.price is not None else None,
-            "currency": c.currency,
-            "competitor_name": c.competitor_name,
-            "catalog_name": c.catalog_name,
-            "catalog_start": str(c.catalog_start) if c.catalog_start else None,
-            "catalog_end": str(c.catalog_end) if c.catalog_end else None,
-            "competitor_page": c.page,
-        }
-        for c in comp_items
+
+def comp_details(c):
+    return {
+        "id": c.item_id,
+        "brand": c.brand,
+        "name": c.item_name,
+        "quantity": c.quantity,
+        "desc": c.item_description,
+        "parent_category": c.parent_category,
+        "sales_category": c.sales_category,
+        "price": float(c.price) if c.price is not None else None,
+        "currency": c.currency,
+        "competitor_name": c.competitor_name,
+        "catalog_name": c.catalog_name,
+        "catalog_start": str(c.catalog_start) if c.catalog_start else None,
+        "catalog_end": str(c.catalog_end) if c.catalog_end else None,
+        "competitor_page": c.page,
     }
 
-    enriched = []
+
+def iter_final_results(llm_results, gg_items, comp_items):
+    """Yield one enriched block per GG item, ready to be streamed out."""
+    # Index the records by id; details are only built for items that
+    # actually appear in the LLM results
+    gg_by_id = {g.item_row_id: g for g in gg_items}
+    comp_by_id = {c.item_id: c for c in comp_items}
+    comp_cache = {}
+
+    def comp_lookup(comp_id):
+        if comp_id not in comp_cache:
+            c = comp_by_id.get(comp_id)
+            comp_cache[comp_id] = comp_details(c) if c is not None else None
+        return comp_cache[comp_id]
 
     for row in llm_results:
 
         gg_id = row["gate_item"]["id"]
-        gg_full = gg_lookup.get(gg_id)
+        gg = gg_by_id.get(gg_id)
+        gg_full = gg_details(gg) if gg is not None else None
 
         enriched_matches = []
 
         for m in row["matches"]:
             comp_id = m["competitor_item_id"]
-            comp_full = comp_lookup.get(comp_id)
+            comp_full = comp_lookup(comp_id)
 
             if not comp_full:
                 continue
@@ -71,9 +81,7 @@ def build_final_results(llm_results, gg_items, comp_items):
                 "similarity_final": float(m["score"])
             })
 
-        enriched.append({
+        yield {
             "gate_item": gg_full,
             "matches": enriched_matches
-        })
-
-    return enriched
+        }
@@ -1,9 +1,10 @@
 # run_matching.py
 
-import json
 from db_loader import load_gate_group_items, load_competitor_items
 from llm_matcher import match_all_items_llm
-from result_builder import build_final_results
+from result_builder import iter_final_results
+from result_sink import open_sink, RESULT_SINK
+import Compariosn_JsonToDB_loader as comparison_loader
 
 
 def run():
@@ -17,14 +18,11 @@ def run():
     print("Running LLM matching...")
     llm_results = match_all_items_llm(gg_items, comp_items)
 
-    print("Building FINAL enriched result...")
-    final_results = build_final_results(llm_results, gg_items, comp_items)
+    print("Streaming FINAL enriched result...")
+    with open_sink(RESULT_SINK, "llm_results", loader=comparison_loader) as sink:
+        sink.write_all(iter_final_results(llm_results, gg_items, comp_items))
 
-    print("Saving results to llm_results.json...")
-    with open("llm_results.json", "w", encoding="utf-8") as f:
-        json.dump(final_results, f, indent=2, ensure_ascii=False)
-
-    print("Done! FINAL output saved to llm_results.json.")
+    print(f"Done! FINAL output saved to {sink.target}.")
 
 
 if __name__ == "__main__":
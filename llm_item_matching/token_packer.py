@@ -0,0 +1,113 @@
+# token_packer.py
+
+import os
+import json
+from config import shared
+
+# ---------------------------------------------------------
+# TOKENIZER (loaded on first use: get_encoding() may download the
+# o200k_base file, which must not happen at import time or offline)
+# ---------------------------------------------------------
+def load_encoding():
+    """tiktoken's gpt-4o encoding, or None to fall back to the usual
+    ~4 characters per token rule of thumb."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("o200k_base")  # gpt-4o family
+    except Exception as e:
+        print(f"⚠ tiktoken unavailable ({e}); estimating 4 chars per token")
+        return None
+
+
+get_encoding = shared(load_encoding)
+
+# ---------------------------------------------------------
+# PER-REQUEST BUDGETS
+# ---------------------------------------------------------
+INPUT_TOKEN_BUDGET = int(os.getenv("LLM_INPUT_TOKEN_BUDGET", "6000"))    # user payload
+OUTPUT_TOKEN_BUDGET = int(os.getenv("LLM_OUTPUT_TOKEN_BUDGET", "4000"))  # sent as max_tokens
+# Share of the input budget a batch of GG items may take
+GG_INPUT_SHARE = 0.35
+
+# Output estimate: per GG item wrapper + per expected match (with reasoning)
+GG_OUTPUT_TOKENS = 25
+MATCH_OUTPUT_TOKENS = 80
+EXPECTED_MATCHES_PER_GG = int(os.getenv("LLM_EXPECTED_MATCHES_PER_GG", "4"))
+
+MAX_GG_PER_BATCH = 10
+MAX_COMP_PER_BATCH = 60
+
+
+def count_tokens(text):
+    encoding = get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return len(text) // 4 + 1
+
+
+def item_tokens(item):
+    return count_tokens(json.dumps(item, ensure_ascii=False)) + 1  # + separator
+
+
+def gg_output_tokens(g):
+    # The gate item name is echoed back, and so is each matched competitor name
+    return (GG_OUTPUT_TOKENS + count_tokens(g["name"])
+            + EXPECTED_MATCHES_PER_GG * MATCH_OUTPUT_TOKENS)
+
+
+# ---------------------------------------------------------
+# PACKING
+# ---------------------------------------------------------
+def pack_gg(gg_items):
+    """Greedily group GG items so each batch fits the output budget and
+    its share of the input budget."""
+    batches, batch, in_tok, out_tok = [], [], 0, 0
+
+    for g in gg_items:
+        g_in, g_out = item_tokens(g), gg_output_tokens(g)
+
+        full = (in_tok + g_in > INPUT_TOKEN_BUDGET * GG_INPUT_SHARE
+                or out_tok + g_out > OUTPUT_TOKEN_BUDGET
+                or len(batch) >= MAX_GG_PER_BATCH)
+        if batch and full:
+            batches.append(batch)
+            batch, in_tok, out_tok = [], 0, 0
+
+        batch.append(g)
+        in_tok += g_in
+        out_tok += g_out
+
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def pack_comp(comp_items, gg_batch):
+    """Fill the input budget left over by `gg_batch` with competitor items."""
+    room = max(1, INPUT_TOKEN_BUDGET - sum(item_tokens(g) for g in gg_batch))
+    batches, batch, used = [], [], 0
+
+    for c in comp_items:
+        c_in = item_tokens(c)
+        if batch and (used + c_in > room or len(batch) >= MAX_COMP_PER_BATCH):
+            batches.append(batch)
+            batch, used = [], 0
+
+        batch.append(c)
+        used += c_in
+
+    if batch:
+        batches.append(batch)
+    return batches
+
+
+def split_batch(gg_batch, comp_batch):
+    """Halve a batch whose response did not fit: GG items first (they drive
+    the output size), then competitor items. None when it is a single pair."""
+    if len(gg_batch) > 1:
+        mid = len(gg_batch) // 2
+        return [(gg_batch[:mid], comp_batch), (gg_batch[mid:], comp_batch)]
+    if len(comp_batch) > 1:
+        mid = len(comp_batch) // 2
+        return [(gg_batch, comp_batch[:mid]), (gg_batch, comp_batch[mid:])]
+    return None
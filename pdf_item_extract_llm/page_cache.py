@@ -0,0 +1,77 @@
+import os
+import json
+import time
+import sqlite3
+import hashlib
+import threading
+
+CACHE_PATH = os.path.join(os.path.dirname(__file__), "llm_page_cache.sqlite")
+CACHE_ENABLED = os.getenv("PDF_LLM_CACHE", "1") != "0"
+
+
+def sha256(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+# ======================================================
+# PAGE-LEVEL LLM RESPONSE CACHE (SQLite)
+# ======================================================
+class PageCache:
+    """Content-addressed store of raw LLM responses per rendered page.
+
+    The key covers everything that changes the answer: the page payload
+    sent to the model (image or text), the filled-in prompt, the
+    deployment and the temperature.
+    """
+
+    def __init__(self, path=CACHE_PATH, enabled=CACHE_ENABLED):
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+        if not enabled:
+            self.conn = None
+            return
+
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("""
+            CREATE TABLE IF NOT EXISTS page_responses (
+                key TEXT PRIMARY KEY,
+                response TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+        """)
+        self.conn.commit()
+
+    @staticmethod
+    def make_key(page_payload, prompt, deployment, temperature):
+        return sha256(json.dumps(
+            [sha256(page_payload), sha256(prompt), deployment, temperature]
+        ))
+
+    def get(self, key):
+        if not self.enabled:
+            return None
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT response FROM page_responses WHERE key = ?", (key,)
+            ).fetchone()
+        if row:
+            self.hits += 1
+            return row[0]
+        self.misses += 1
+        return None
+
+    def put(self, key, response):
+        # Empty responses are failures; never cache them
+        if not self.enabled or not response:
+            return
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO page_responses VALUES (?, ?, ?)",
+                (key, response, time.time())
+            )
+            self.conn.commit()
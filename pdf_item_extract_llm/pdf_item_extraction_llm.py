@@ -4,6 +4,7 @@ import base64
 import json
 from dotenv import load_dotenv
 from openai import AzureOpenAI
+from page_cache import PageCache
 
 # ======================================================
 # INITIAL SETUP
@@ -12,7 +13,9 @@ load_dotenv()
 
 INPUT_DIR = "input_files"
 OUTPUT_DIR = "output"
+LOG_DIR = "logs"
 os.makedirs(OUTPUT_DIR, exist_ok=True)
+os.makedirs(LOG_DIR, exist_ok=True)
 
 client = AzureOpenAI(
     api_key=os.getenv("AZURE_OPENAI_API_KEY"),
@@ -21,6 +24,9 @@ client = AzureOpenAI(
 )
 
 AZURE_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT")
+TEMPERATURE = 0
+
+page_cache = PageCache()
 
 
 # ======================================================
@@ -83,12 +89,17 @@ def update_globals(parsed):
 # LLM CALL (PNG only – Azure Vision approved)
 # ======================================================
 def call_llm_png(png_bytes, prompt):
+    cache_key = PageCache.make_key(png_bytes, prompt, AZURE_DEPLOYMENT, TEMPERATURE)
+    cached = page_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
     b64 = base64.b64encode(png_bytes).decode("utf-8")
     data_url = f"data:image/png;base64,{b64}"
 
     response = client.chat.completions.create(
         model=AZURE_DEPLOYMENT,
-        temperature=0,
+        temperature=TEMPERATURE,
         max_tokens=8000,
         messages=[
             {"role": "system", "content": prompt},
@@ -104,27 +115,38 @@ def call_llm_png(png_bytes, prompt):
         ]
     )
 
-    return response.choices[0].message.content
+    content = response.choices[0].message.content
+    # Only complete, parseable answers are kept; a reply cut off at
+    # max_tokens ("length") must be retried next run
+    if response.choices[0].finish_reason == "stop" and try_parse_json(content) is not None:
+        page_cache.put(cache_key, content)
+    return content
 
 
 # ======================================================
 # PARSE JSON
 # ======================================================
-def parse_json(output):
+def try_parse_json(output):
+    """Parsed JSON, or None if the output is empty or not valid JSON."""
     if not output:
-        return {"items": []}
+        return None
 
     cleaned = output.strip().replace("```json", "").replace("```", "")
     try:
         return json.loads(cleaned)
     except Exception:
-        return {"items": []}
+        return None
+
+
+def parse_json(output):
+    parsed = try_parse_json(output)
+    return parsed if parsed is not None else {"items": []}
 
 
 # ======================================================
 # PROCESS A SINGLE PDF PAGE
 # ======================================================
-def process_page(doc, idx):
+def process_page(doc, idx, catalog_name):
     page = doc[idx]
     page_num = idx + 1
 
@@ -140,6 +162,9 @@ def process_page(doc, idx):
 
     try:
         llm_output = call_llm_png(png_bytes, prompt)
+        # Keyed by catalog too, so PDFs don't overwrite each other's dumps
+        with open(os.path.join(LOG_DIR, f"{catalog_name}_page_{page_num}_raw.txt"), "w", encoding="utf-8") as f:
+            f.write(llm_output or "")
         parsed = parse_json(llm_output)
         update_globals(parsed)
 
@@ -166,10 +191,11 @@ def process_pdf(pdf_path):
     print(f"\n📄 Processing PDF → {pdf_path}")
 
     doc = fitz.open(pdf_path)
+    catalog_name = os.path.splitext(os.path.basename(pdf_path))[0]
     all_items = []
 
     for i in range(len(doc)):
-        items = process_page(doc, i)
+        items = process_page(doc, i, catalog_name)
         all_items.extend(items)
 
     output_path = os.path.join(
@@ -181,6 +207,7 @@ def process_pdf(pdf_path):
         json.dump(all_items, f, indent=2, ensure_ascii=False)
 
     print(f"\n✅ Extraction Complete → Saved: {output_path}")
+    print(f"   LLM page cache: {page_cache.hits} hits / {page_cache.misses} misses")
 
 
 # ======================================================
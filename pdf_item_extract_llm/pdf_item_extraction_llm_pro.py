@@ -1,12 +1,16 @@
 import os
+import io
+import math
 import fitz
 import base64
 import json
 import time
+import asyncio
 import logging
-import concurrent.futures
 from dotenv import load_dotenv
-from openai import AzureOpenAI
+from openai import AsyncAzureOpenAI
+from rate_limiter import RateLimiter
+from page_cache import PageCache
 
 # ======================================================
 # INITIAL SETUP
@@ -26,14 +30,52 @@ logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(message)s"
 )
 
-client = AzureOpenAI(
+client = AsyncAzureOpenAI(
     api_key=os.getenv("AZURE_OPENAI_API_KEY"),
     azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
     api_version="2024-02-15-preview",
+    max_retries=0,  # retries/backoff are handled by RateLimiter
 )
 
 AZURE_DEPLOYMENT = os.getenv("AZURE_OPENAI_DEPLOYMENT")
+
+# Deployment quota (set these to the values shown in Azure AI Foundry)
+AZURE_RPM = int(os.getenv("AZURE_OPENAI_RPM", "60"))
+AZURE_TPM = int(os.getenv("AZURE_OPENAI_TPM", "100000"))
+
+# Concurrency starts here and adapts to the observed throttle rate
 THREAD_COUNT = 5
+MAX_CONCURRENCY = int(os.getenv("PDF_MAX_CONCURRENCY", "16"))
+# Rendered pages buffered ahead of the LLM stage
+PAGE_QUEUE_SIZE = int(os.getenv("PDF_PAGE_QUEUE_SIZE", "8"))
+
+MAX_TOKENS = 8000
+TEMPERATURE = 0
+
+page_cache = PageCache()
+
+# ======================================================
+# IMAGE PIPELINE SETTINGS
+# ======================================================
+IMAGE_FORMAT = os.getenv("PDF_IMAGE_FORMAT", "jpeg")       # png | jpeg | webp
+IMAGE_QUALITY = int(os.getenv("PDF_IMAGE_QUALITY", "85"))  # jpeg/webp only
+
+# DPI scales with text density: sparse pages → MIN_DPI, dense → MAX_DPI
+# (MAX_DPI is the old fixed 250, so dense price lists keep their legibility)
+MIN_DPI = int(os.getenv("PDF_MIN_DPI", "110"))
+MAX_DPI = int(os.getenv("PDF_MAX_DPI", "250"))
+DENSE_CHARS_PER_SQIN = 40
+
+# Opt-in downscaling to the vision model's effective resolution (it
+# rescales to fit 2048px, then to 768px on the short side). Smaller
+# uploads, but small print shrinks too: an A4 page capped at 768px is
+# ~93 dpi. 0 (default) = off; measure accuracy before turning it on.
+MAX_LONG_SIDE = int(os.getenv("PDF_MAX_LONG_SIDE", "0"))
+MAX_SHORT_SIDE = int(os.getenv("PDF_MAX_SHORT_SIDE", "0"))
+
+# Send text only when get_text() already yields at least this many chars
+# (0 = always send the image)
+TEXT_ONLY_MIN_CHARS = int(os.getenv("PDF_TEXT_ONLY_MIN_CHARS", "0"))
 
 # ======================================================
 # SYSTEM PROMPT
@@ -93,52 +135,128 @@ def safe_parse(raw):
     except:
         return {}
 
+# ======================================================
+# IMAGE ENCODING
+# ======================================================
+def pick_dpi(page, text):
+    """Higher DPI for text-dense pages, lower for sparse/photo pages."""
+    area_sqin = (page.rect.width / 72) * (page.rect.height / 72)
+    density = len(text) / area_sqin if area_sqin else 0
+    return MIN_DPI + (MAX_DPI - MIN_DPI) * min(1.0, density / DENSE_CHARS_PER_SQIN)
+
+
+def pick_zoom(page, dpi):
+    """Zoom factor for the DPI, capped by the opt-in side limits."""
+    zoom = dpi / 72
+    long_pt = max(page.rect.width, page.rect.height)
+    short_pt = min(page.rect.width, page.rect.height)
+    if MAX_LONG_SIDE:
+        zoom = min(zoom, MAX_LONG_SIDE / long_pt)
+    if MAX_SHORT_SIDE:
+        zoom = min(zoom, MAX_SHORT_SIDE / short_pt)
+    return zoom
+
+
+def encode_pixmap(pix):
+    """Encode a pixmap as (mime type, bytes) in the configured format."""
+    if IMAGE_FORMAT == "png":
+        return "image/png", pix.tobytes("png")
+    if IMAGE_FORMAT == "jpeg":
+        return "image/jpeg", pix.tobytes("jpg", jpg_quality=IMAGE_QUALITY)
+    if IMAGE_FORMAT == "webp":
+        from PIL import Image
+        img = Image.frombytes("RGB", (pix.width, pix.height), pix.samples)
+        buf = io.BytesIO()
+        img.save(buf, format="WEBP", quality=IMAGE_QUALITY)
+        return "image/webp", buf.getvalue()
+    raise ValueError(f"Unsupported PDF_IMAGE_FORMAT: {IMAGE_FORMAT}")
+
+
+def image_tokens(width, height):
+    """Approximate high-detail image tokens: 85 + 170 per 512px tile."""
+    scale = min(1.0, 2048 / max(width, height))
+    width, height = width * scale, height * scale
+    scale = min(1.0, 768 / min(width, height))
+    width, height = width * scale, height * scale
+    return 85 + 170 * math.ceil(width / 512) * math.ceil(height / 512)
+
 # ======================================================
 # LLM CALL
 # ======================================================
-def call_azure_with_retry(data_url, prompt, retries=5):
-    for attempt in range(1, retries + 1):
-        try:
-            r = client.chat.completions.create(
-                model=AZURE_DEPLOYMENT,
-                temperature=0,
-                max_tokens=8000,
-                messages=[
-                    {"role": "system", "content": prompt},
-                    {"role": "user", "content": [
-                        {"type": "image_url", "image_url": {"url": data_url}}
-                    ]}
-                ]
-            )
-            return r.choices[0].message.content
-
-        except Exception as e:
-            logging.warning(f"[Retry {attempt}] {e}")
-            time.sleep(attempt * 1.5)
-
-    return ""
+def estimate_tokens(prompt, rendered):
+    """Tokens Azure charges against TPM: prompt + image + max_tokens."""
+    return len(prompt) // 4 + rendered["image_tokens"] + MAX_TOKENS
+
+
+def user_content(rendered):
+    if rendered["data_url"] is None:
+        return rendered["text"]
+    return [{"type": "image_url", "image_url": {"url": rendered["data_url"]}}]
+
+
+async def call_azure_with_retry(limiter, rendered, prompt):
+    cache_key = PageCache.make_key(
+        rendered["data_url"] or rendered["text"], prompt, AZURE_DEPLOYMENT, TEMPERATURE
+    )
+    cached = page_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    def make_request():
+        return client.chat.completions.create(
+            model=AZURE_DEPLOYMENT,
+            temperature=TEMPERATURE,
+            max_tokens=MAX_TOKENS,
+            messages=[
+                {"role": "system", "content": prompt},
+                {"role": "user", "content": user_content(rendered)}
+            ]
+        )
+
+    r = await limiter.call(make_request, estimate_tokens(prompt, rendered))
+    raw = r.choices[0].message.content if r else ""
+    # Only complete, parseable answers are kept; a reply cut off at
+    # max_tokens ("length") or a failed call must be retried next run
+    if r and r.choices[0].finish_reason == "stop" and safe_parse(raw):
+        page_cache.put(cache_key, raw)
+    return raw
 
 # ======================================================
 # PROCESS ONE PAGE
 # ======================================================
-def process_single_page(pdf_path, idx, catalog_name):
-    doc = fitz.open(pdf_path)
+def render_page(doc, idx):
     page = doc[idx]
-    page_num = idx + 1
 
     text = page.get_text("text").strip()
-    prompt = build_prompt(text, page_num)
+    rendered = {"text": text, "data_url": None, "dpi": None, "dpi_requested": None,
+                "payload_bytes": 0, "image_tokens": 0}
 
-    pix = page.get_pixmap(dpi=250)
-    png_bytes = pix.tobytes("png")
-    data_url = "data:image/png;base64," + base64.b64encode(png_bytes).decode()
+    if TEXT_ONLY_MIN_CHARS and len(text) >= TEXT_ONLY_MIN_CHARS:
+        return rendered
 
-    total = fitz.open(pdf_path).page_count if hasattr(fitz.open(pdf_path), "page_count") else "?"
-    print(f"➡️ Page {page_num}: Sending to LLM…")
+    dpi = pick_dpi(page, text)
+    zoom = pick_zoom(page, dpi)
+    pix = page.get_pixmap(matrix=fitz.Matrix(zoom, zoom), alpha=False)
+    mime, img_bytes = encode_pixmap(pix)
 
-    raw = call_azure_with_retry(data_url, prompt)
+    rendered["data_url"] = f"data:{mime};base64," + base64.b64encode(img_bytes).decode()
+    rendered["dpi_requested"] = round(dpi)
+    rendered["dpi"] = round(zoom * 72)
+    rendered["payload_bytes"] = len(img_bytes)
+    rendered["image_tokens"] = image_tokens(pix.width, pix.height)
+    return rendered
 
-    with open(os.path.join(LOG_DIR, f"page_{page_num}_raw.txt"), "w", encoding="utf-8") as f:
+
+async def process_single_page(limiter, idx, rendered, catalog_name):
+    page_num = idx + 1
+    prompt = build_prompt(rendered["text"], page_num)
+
+    print(f"➡️ Page {page_num}: Sending to LLM…")
+
+    sent = time.time()
+    raw = await call_azure_with_retry(limiter, rendered, prompt)
+    latency = time.time() - sent
+    with open(os.path.join(LOG_DIR, f"{catalog_name}_page_{page_num}_raw.txt"), "w", encoding="utf-8") as f:
         f.write(raw or "")
 
     parsed = safe_parse(raw)
@@ -188,9 +306,21 @@ def process_single_page(pdf_path, idx, catalog_name):
 
         items_out.append(out)
 
-    print(f"✔ Page {page_num} done ({len(items_out)} items)")
+    if not rendered["dpi"]:
+        image = "text-only"
+    elif rendered["dpi"] != rendered["dpi_requested"]:
+        image = f"{rendered['dpi']} dpi (requested {rendered['dpi_requested']}, capped)"
+    else:
+        image = f"{rendered['dpi']} dpi"
+    print(
+        f"✔ Page {page_num} done ({len(items_out)} items, "
+        f"{rendered['payload_bytes'] / 1024:.0f} KB @ {image}, "
+        f"LLM {latency:.1f}s)"
+    )
     return {
         "page_num": page_num,
+        "payload_bytes": rendered["payload_bytes"],
+        "llm_seconds": latency,
         "competitor": comp,
         "start": start,
         "end": end,
@@ -200,23 +330,68 @@ def process_single_page(pdf_path, idx, catalog_name):
 # ======================================================
 # FINAL PDF PROCESSOR
 # ======================================================
-def process_pdf(pdf_path):
+async def produce_pages(pdf_path, queue, n_workers):
+    """Open the PDF once and stream rendered pages into the bounded queue."""
+    doc = await asyncio.to_thread(fitz.open, pdf_path)
+    try:
+        for idx in range(len(doc)):
+            rendered = await asyncio.to_thread(render_page, doc, idx)
+            await queue.put((idx, rendered))
+    finally:
+        doc.close()
+        for _ in range(n_workers):
+            await queue.put(None)
+
+
+async def page_worker(limiter, queue, catalog_name, page_results):
+    while True:
+        job = await queue.get()
+        if job is None:
+            return
+        idx, rendered = job
+        page_results.append(
+            await process_single_page(limiter, idx, rendered, catalog_name)
+        )
+
+
+async def extract_pages(pdf_path, catalog_name):
+    limiter = RateLimiter(AZURE_RPM, AZURE_TPM, THREAD_COUNT, MAX_CONCURRENCY)
+    started = time.time()
+
+    # Rendered pages wait here for a free worker; the bound caps memory
+    queue = asyncio.Queue(maxsize=PAGE_QUEUE_SIZE)
+    page_results = []
+
+    await asyncio.gather(
+        produce_pages(pdf_path, queue, MAX_CONCURRENCY),
+        *[
+            page_worker(limiter, queue, catalog_name, page_results)
+            for _ in range(MAX_CONCURRENCY)
+        ]
+    )
+
+    print(
+        f"⏱ {len(page_results)} pages in {round(time.time() - started, 1)}s "
+        f"({limiter.throttled} throttled calls, final concurrency {limiter.concurrency.limit}, "
+        f"cache {page_cache.hits} hits / {page_cache.misses} misses)"
+    )
+    if page_results:
+        total_bytes = sum(r["payload_bytes"] for r in page_results)
+        latencies = sorted(r["llm_seconds"] for r in page_results)
+        print(
+            f"📦 Payload: {total_bytes / 1024 / 1024:.1f} MB total, "
+            f"{total_bytes / len(page_results) / 1024:.0f} KB/page avg | "
+            f"LLM latency p50 {latencies[len(latencies) // 2]:.1f}s, max {latencies[-1]:.1f}s"
+        )
+    return page_results
+
+
+async def process_pdf(pdf_path):
     print(f"\n📄 Processing PDF: {pdf_path}")
     filename = os.path.basename(pdf_path)
     catalog_name = filename.replace(".pdf", "")
 
-    doc = fitz.open(pdf_path)
-    pages = len(doc)
-
-    page_results = []
-
-    with concurrent.futures.ThreadPoolExecutor(max_workers=THREAD_COUNT) as exe:
-        futures = [
-            exe.submit(process_single_page, pdf_path, i, catalog_name)
-            for i in range(pages)
-        ]
-        for f in concurrent.futures.as_completed(futures):
-            page_results.append(f.result())
+    page_results = await extract_pages(pdf_path, catalog_name)
 
     # consolidate metadata
     competitor = next((r["competitor"] for r in page_results if r["competitor"]), None)
@@ -250,10 +425,13 @@ def process_pdf(pdf_path):
 # ======================================================
 # MAIN
 # ======================================================
-def process_all_pdfs():
+async def process_all_pdfs_async():
     for f in os.listdir(INPUT_DIR):
         if f.lower().endswith(".pdf"):
-            process_pdf(os.path.join(INPUT_DIR, f))
+            await process_pdf(os.path.join(INPUT_DIR, f))
+
+def process_all_pdfs():
+    asyncio.run(process_all_pdfs_async())
 
 if __name__ == "__main__":
     process_all_pdfs()
@@ -0,0 +1,166 @@
+import time
+import random
+import asyncio
+import logging
+from openai import RateLimitError
+
+
+# ======================================================
+# TOKEN BUCKET (requests/min or tokens/min)
+# ======================================================
+class TokenBucket:
+    """Refills `per_minute` units per minute, bursting up to one minute."""
+
+    def __init__(self, per_minute):
+        self.capacity = float(per_minute)
+        self.tokens = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount=1):
+        amount = min(amount, self.capacity)
+        while True:
+            async with self.lock:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / self.rate
+            # Sleep without the lock so smaller requests are not held up
+            await asyncio.sleep(wait)
+
+    def adjust(self, amount):
+        """Give back (positive) or charge (negative) units after the fact."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens + amount)
+
+
+# ======================================================
+# ADAPTIVE CONCURRENCY (AIMD)
+# ======================================================
+class AdaptiveConcurrency:
+    """Halve the in-flight limit on throttling, +1 after a success streak."""
+
+    def __init__(self, initial, maximum, increase_after=5):
+        self.limit = initial
+        self.maximum = maximum
+        self.increase_after = increase_after
+        self.active = 0
+        self.streak = 0
+        self.cond = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.cond:
+            await self.cond.wait_for(lambda: self.active < self.limit)
+            self.active += 1
+
+    async def __aexit__(self, *exc):
+        async with self.cond:
+            self.active -= 1
+            self.cond.notify_all()
+
+    def on_success(self):
+        self.streak += 1
+        if self.streak >= self.increase_after and self.limit < self.maximum:
+            self.limit += 1
+            self.streak = 0
+
+    def on_throttle(self):
+        self.streak = 0
+        self.limit = max(1, self.limit // 2)
+
+
+# ======================================================
+# RATE-LIMITED CALLER
+# ======================================================
+def retry_after_seconds(err):
+    """Read Retry-After (ms or s) from a 429 response, if present."""
+    headers = getattr(getattr(err, "response", None), "headers", None) or {}
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except ValueError:
+        pass
+    return None
+
+
+class RateLimiter:
+    """Schedules LLM calls within RPM/TPM quotas with adaptive concurrency."""
+
+    def __init__(self, rpm, tpm, concurrency, max_concurrency,
+                 retries=6, base_delay=1.0, max_delay=60.0):
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.concurrency = AdaptiveConcurrency(concurrency, max_concurrency)
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.paused_until = 0.0
+        self.throttled = 0
+
+    def backoff(self, attempt):
+        # Full jitter exponential backoff
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+
+    async def wait_if_paused(self):
+        delay = self.paused_until - time.monotonic()
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+    async def call(self, make_request, est_tokens):
+        """Run `await make_request()` under the quotas, retrying failures.
+
+        `est_tokens` is charged up front; the difference to the reported
+        usage is settled once the response arrives.
+        """
+        for attempt in range(self.retries):
+            await self.wait_if_paused()
+
+            async with self.concurrency:
+                await self.requests.acquire(1)
+                await self.tokens.acquire(est_tokens)
+
+                try:
+                    response = await make_request()
+
+                except RateLimitError as e:
+                    # A rejected request used no quota; the retry charges again
+                    self.tokens.adjust(est_tokens)
+                    self.throttled += 1
+                    self.concurrency.on_throttle()
+                    delay = retry_after_seconds(e) or self.backoff(attempt)
+                    # Everyone waits out the server's Retry-After
+                    self.paused_until = max(self.paused_until, time.monotonic() + delay)
+                    logging.warning(
+                        f"[429] Throttled (attempt {attempt + 1}); waiting {delay:.1f}s, "
+                        f"concurrency → {self.concurrency.limit}"
+                    )
+                    continue
+
+                except Exception as e:
+                    error = e
+                else:
+                    error = None
+
+            if error is not None:
+                # Back off outside the concurrency slot
+                delay = self.backoff(attempt)
+                logging.warning(f"[Retry {attempt + 1}] {error}; waiting {delay:.1f}s")
+                await asyncio.sleep(delay)
+                continue
+
+            usage = getattr(response, "usage", None)
+            if usage is not None and usage.total_tokens:
+                self.tokens.adjust(est_tokens - usage.total_tokens)
+            self.concurrency.on_success()
+            return response
+
+        return None
@@ -0,0 +1,237 @@
+# result_sink.py
+#
+# Result sinks shared by itemMappingAzure and llm_item_matching. The SQL
+# sink is given the package's Compariosn_JsonToDB_loader module, which
+# owns the target table and its row mapping.
+
+import os
+import queue
+import logging
+import threading
+from abc import ABC, abstractmethod
+
+from sql_engine import begin
+from result_writer import ResultWriter, result_path, RESULT_FORMAT, RESULT_COMPACT
+
+logger = logging.getLogger("pipeline")
+
+# ---------------------------------------------------------
+# RESULT SINKS
+#   json  → streamed JSON array file
+#   jsonl → JSON Lines file
+#   sql   → comparison table, bulk-loaded by a background writer thread
+# Comma-separate to write to several at once (e.g. "jsonl,sql").
+# ---------------------------------------------------------
+RESULT_SINK = os.getenv("RESULT_SINK", RESULT_FORMAT)
+
+# Rows per MERGE/INSERT transaction of the SQL sink
+SINK_BATCH_ROWS = int(os.getenv("SINK_BATCH_ROWS", "2000"))
+# Row batches waiting for the writer thread before matching blocks
+SINK_QUEUE_BATCHES = int(os.getenv("SINK_QUEUE_BATCHES", "4"))
+
+
+class ResultSink(ABC):
+    """Destination for per-GG result blocks, written as they are produced."""
+
+    target = None
+
+    @abstractmethod
+    def write(self, block):
+        ...
+
+    def retract(self, keys):
+        """Remove previously written matches (sql_engine.match_key tuples).
+        File sinks rewrite the whole file, so there is nothing to do."""
+        pass
+
+    def close(self):
+        pass
+
+    def abort(self):
+        """Called instead of close() when writing failed."""
+        self.close()
+
+    def write_all(self, blocks):
+        for block in blocks:
+            self.write(block)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *_):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+class JsonSink(ResultSink):
+    fmt = "json"
+
+    def __init__(self, path, compact=RESULT_COMPACT, default=None):
+        self.target = result_path(path, self.fmt)
+        self.writer = ResultWriter(self.target, self.fmt, compact, default)
+
+    def write(self, block):
+        self.writer.write(block)
+
+    def close(self):
+        self.writer.close()
+
+    def abort(self):
+        self.writer.abort()
+
+
+class JsonlSink(JsonSink):
+    fmt = "jsonl"
+
+
+class SqlSink(ResultSink):
+    """Bulk-loads result rows into the comparison table while matching
+    continues: blocks are flattened here, and a writer thread upserts
+    them SINK_BATCH_ROWS at a time (one transaction per batch). Retracted
+    matches are deleted by the same thread.
+
+    `loader` is a Compariosn_JsonToDB_loader module (TARGET_TABLE,
+    LOAD_MODE, build_rows, upsert_rows, insert_rows, delete_rows).
+    """
+
+    def __init__(self, loader, mode=None, batch_rows=SINK_BATCH_ROWS):
+        self.loader = loader
+        self.target = loader.TARGET_TABLE
+        self.mode = mode or loader.LOAD_MODE
+        self.batch_rows = batch_rows
+        self.rows = []
+        self.inserted = 0
+        self.updated = 0
+        self.deleted = 0
+        self.error = None
+        self.aborted = False
+
+        # Bounded: a slow database holds the matcher back instead of
+        # letting rows pile up in memory
+        self.queue = queue.Queue(maxsize=SINK_QUEUE_BATCHES)
+        self.thread = threading.Thread(target=self._run, name="sql-sink", daemon=True)
+        self.thread.start()
+
+    def _run(self):
+        while True:
+            item = self.queue.get()
+            if item is None:
+                return
+            if self.error or self.aborted:
+                continue  # drain, so the producer never blocks
+            action, rows = item
+            try:
+                with begin() as conn:
+                    if action == "delete":
+                        self.deleted += self.loader.delete_rows(conn, rows)
+                    else:
+                        load = (self.loader.insert_rows if self.mode == "insert"
+                                else self.loader.upsert_rows)
+                        inserted, updated = load(conn, rows)
+                        self.inserted += inserted
+                        self.updated += updated
+            except Exception as e:
+                logger.error(f"❌ SQL sink {action} failed ({len(rows)} rows): {e}")
+                self.error = e
+
+    def _check(self):
+        if self.error:
+            raise RuntimeError(f"SQL sink failed: {self.error}") from self.error
+
+    def write(self, block):
+        self._check()
+        self.rows.extend(self.loader.build_rows([block]))
+        if len(self.rows) >= self.batch_rows:
+            self.queue.put(("load", self.rows))
+            self.rows = []
+
+    def retract(self, keys):
+        self._check()
+        keys = list(keys)
+        for start in range(0, len(keys), self.batch_rows):
+            self.queue.put(("delete", keys[start:start + self.batch_rows]))
+
+    def close(self):
+        if self.rows:
+            self.queue.put(("load", self.rows))
+            self.rows = []
+        self.queue.put(None)
+        self.thread.join()
+        self._check()
+        logger.info(
+            f"🗄 {self.target}: {self.inserted} inserted, {self.updated} updated, "
+            f"{self.deleted} deleted"
+        )
+
+    def abort(self):
+        """Discard the rows (and retractions) not loaded yet and stop the
+        writer thread without committing them. A batch the thread has
+        already started still commits: each batch is its own transaction."""
+        self.aborted = True
+        discarded = len(self.rows)
+        self.rows = []
+        while True:
+            try:
+                item = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if item is not None and item[0] == "load":
+                discarded += len(item[1])
+        self.queue.put(None)
+        self.thread.join()
+        logger.warning(f"🗄 {self.target}: aborted, {discarded} pending rows discarded")
+
+
+class MultiSink(ResultSink):
+    """Fans every block out to several sinks."""
+
+    def __init__(self, sinks):
+        self.sinks = sinks
+        self.target = " + ".join(s.target for s in sinks)
+
+    def write(self, block):
+        for sink in self.sinks:
+            sink.write(block)
+
+    def retract(self, keys):
+        keys = list(keys)
+        for sink in self.sinks:
+            sink.retract(keys)
+
+    def close(self):
+        self._each("close")
+
+    def abort(self):
+        self._each("abort")
+
+    def _each(self, method):
+        errors = []
+        for sink in self.sinks:
+            try:
+                getattr(sink, method)()
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+
+
+def open_sink(spec, path, compact=RESULT_COMPACT, default=None, loader=None):
+    """Build the sink(s) named in `spec` ("json", "jsonl", "sql" or a
+    comma-separated mix); file sinks write to `path` + extension, the SQL
+    sink loads through `loader` (see SqlSink)."""
+    sinks = []
+    for name in (s.strip() for s in spec.split(",")):
+        if name == "json":
+            sinks.append(JsonSink(path, compact, default))
+        elif name == "jsonl":
+            sinks.append(JsonlSink(path, default=default))
+        elif name == "sql":
+            if loader is None:
+                raise ValueError("The sql result sink needs a comparison loader")
+            sinks.append(SqlSink(loader))
+        else:
+            raise ValueError(f"Unknown result sink: {name}")
+
+    return sinks[0] if len(sinks) == 1 else MultiSink(sinks)
@@ -0,0 +1,101 @@
+# result_writer.py
+#
+# Streaming JSON / JSONL result files, shared by every matching pipeline
+# (itemMappingAzure, itemMapping and llm_item_matching).
+
+import os
+import json
+import textwrap
+
+# ---------------------------------------------------------
+# STREAMING RESULT WRITER
+#   "json"  → one JSON array, written block by block
+#   "jsonl" → one compact block per line, flushed as it is written, so
+#             loaders can start consuming (<path>.tmp) before matching
+#             finishes
+# Output goes to <path>.tmp and replaces <path> only when the writer is
+# closed cleanly; a run that fails leaves the previous file untouched.
+# ---------------------------------------------------------
+RESULT_FORMAT = os.getenv("RESULT_FORMAT", "json")
+# Compact JSON arrays: no indentation (JSONL is always compact)
+RESULT_COMPACT = os.getenv("RESULT_COMPACT", "0") == "1"
+
+
+def result_path(base, fmt=RESULT_FORMAT):
+    """`base` with the extension of the output format."""
+    return f"{os.path.splitext(base)[0]}.{fmt}"
+
+
+class ResultWriter:
+    """Writes per-GG result blocks to `path` one at a time, so the full
+    result list is never held in memory."""
+
+    def __init__(self, path, fmt=RESULT_FORMAT, compact=RESULT_COMPACT, default=None):
+        if fmt not in ("json", "jsonl"):
+            raise ValueError(f"Unknown result format: {fmt}")
+
+        self.path = path
+        self.fmt = fmt
+        self.compact = compact or fmt == "jsonl"
+        self.default = default
+        self.count = 0
+        self.tmp_path = f"{path}.tmp"
+        self.f = open(self.tmp_path, "w", encoding="utf-8")
+
+    def encode(self, block):
+        if self.compact:
+            return json.dumps(block, ensure_ascii=False, separators=(",", ":"), default=self.default)
+        # Same layout as json.dump(results, f, indent=2)
+        return textwrap.indent(
+            json.dumps(block, indent=2, ensure_ascii=False, default=self.default), "  "
+        )
+
+    def write(self, block):
+        if self.fmt == "jsonl":
+            self.f.write(self.encode(block) + "\n")
+            self.f.flush()
+        else:
+            self.f.write(("[" if self.count == 0 else ",") + ("" if self.compact else "\n"))
+            self.f.write(self.encode(block))
+        self.count += 1
+
+    def write_all(self, blocks):
+        for block in blocks:
+            self.write(block)
+        return self.count
+
+    def close(self):
+        if self.fmt == "json":
+            if self.count == 0:
+                self.f.write("[]")
+            else:
+                self.f.write("]" if self.compact else "\n]")
+        self.f.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        """Drop the partial output; `path` keeps its previous contents."""
+        self.f.close()
+        os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *_):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def iter_results(path):
+    """Yield the result blocks of a .json (array) or .jsonl output file."""
+    if path.lower().endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+        return
+
+    with open(path, "r", encoding="utf-8") as f:
+        yield from json.load(f)
@@ -0,0 +1,315 @@
+# sql_engine.py
+#
+# The pooled Azure SQL engine shared by every pipeline (itemMappingAzure,
+# itemMapping, llm_item_matching and the JSON loader). Each package's
+# config.py re-exports what it needs from here and keeps only its own
+# settings (API clients, logging).
+
+import os
+import time
+import logging
+import threading
+import functools
+from contextlib import contextmanager
+from sqlalchemy import create_engine, event, text
+from sqlalchemy.engine import URL
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Silent unless the pipeline configures logging (see itemMappingAzure/logger.py)
+logger = logging.getLogger("pipeline")
+
+# Path to a local SQLite fixture (see test_scripts/build_offline_fixture.py).
+# When set, every loader reads from it instead of Azure SQL.
+OFFLINE_SQLITE = os.getenv("OFFLINE_SQLITE")
+
+
+# ---------------------------------------------------------
+# SQL ENGINE SETTINGS
+# ---------------------------------------------------------
+SQL_DRIVER = os.getenv("AZURE_SQL_DRIVER", "pymssql")  # pymssql | pytds | pyodbc
+ODBC_DRIVER = os.getenv("AZURE_SQL_ODBC_DRIVER", "ODBC Driver 18 for SQL Server")
+POOL_SIZE = int(os.getenv("SQL_POOL_SIZE", "5"))
+MAX_OVERFLOW = int(os.getenv("SQL_MAX_OVERFLOW", "10"))
+POOL_TIMEOUT = int(os.getenv("SQL_POOL_TIMEOUT", "30"))
+# Azure SQL drops idle connections; recycle well before that
+POOL_RECYCLE = int(os.getenv("SQL_POOL_RECYCLE", "180"))
+# Rows fetched per round trip by streamed (server-side cursor) reads
+STREAM_BATCH_SIZE = int(os.getenv("SQL_STREAM_BATCH_SIZE", "2000"))
+
+
+def sql_url():
+    return URL.create(
+        f"mssql+{SQL_DRIVER}",
+        username=os.getenv("AZURE_SQL_USERNAME"),
+        password=os.getenv("AZURE_SQL_PASSWORD"),
+        host=os.getenv("AZURE_SQL_SERVER"),
+        database=os.getenv("AZURE_SQL_DATABASE"),
+        query={"driver": ODBC_DRIVER} if SQL_DRIVER == "pyodbc" else {},
+    )
+
+
+def engine_options():
+    options = {
+        "pool_size": POOL_SIZE,
+        "max_overflow": MAX_OVERFLOW,
+        "pool_timeout": POOL_TIMEOUT,
+        "pool_recycle": POOL_RECYCLE,
+        "pool_pre_ping": True,
+    }
+    if SQL_DRIVER == "pyodbc":
+        # Sends all executemany() parameter sets in one round trip
+        options["fast_executemany"] = True
+    return options
+
+
+# ---------------------------------------------------------
+# POOL METRICS
+# ---------------------------------------------------------
+class PoolMetrics:
+    """Connection pool counters for the shared engine."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.connects = 0
+        self.checkouts = 0
+        self.in_use = 0
+        self.peak_in_use = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def on_connect(self, *_):
+        with self.lock:
+            self.connects += 1
+
+    def on_checkout(self, *_):
+        with self.lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.peak_in_use = max(self.peak_in_use, self.in_use)
+
+    def on_checkin(self, *_):
+        with self.lock:
+            self.in_use -= 1
+
+    def record_wait(self, seconds):
+        with self.lock:
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def summary(self):
+        with self.lock:
+            avg_ms = 1000 * self.wait_total / self.checkouts if self.checkouts else 0.0
+            return (
+                f"{self.connects} connections opened | {self.checkouts} checkouts | "
+                f"peak in use {self.peak_in_use} | checkout wait avg {avg_ms:.1f} ms, "
+                f"max {1000 * self.wait_max:.1f} ms"
+            )
+
+
+pool_metrics = PoolMetrics()
+
+
+def instrument(engine):
+    event.listen(engine, "connect", pool_metrics.on_connect)
+    event.listen(engine, "checkout", pool_metrics.on_checkout)
+    event.listen(engine, "checkin", pool_metrics.on_checkin)
+    return engine
+
+
+def offline_engine(path):
+    """SQLite stand-in for Azure SQL; `dbo.<table>` resolves to the same file."""
+    logger.info(f"OFFLINE mode: using SQLite fixture {path}")
+    engine = instrument(create_engine(f"sqlite:///{path}"))
+
+    @event.listens_for(engine, "connect")
+    def attach_dbo(dbapi_conn, _):
+        dbapi_conn.execute("ATTACH DATABASE ? AS dbo", (path,))
+
+    return engine
+
+
+def get_sql_engine():
+    """Return the pooled SQLAlchemy engine for Azure SQL (driver: AZURE_SQL_DRIVER)."""
+    if OFFLINE_SQLITE:
+        return offline_engine(OFFLINE_SQLITE)
+
+    try:
+        logger.info(f"Connecting to Azure SQL ({SQL_DRIVER})...")
+
+        engine = instrument(create_engine(sql_url(), **engine_options()))
+
+        # IMPORTANT: wrap SQL in text()
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+        logger.info("Connected to Azure SQL successfully.")
+        return engine
+
+    except Exception as e:
+        logger.error("Azure SQL connection FAILED!")
+        logger.error(e, exc_info=True)
+        raise
+
+
+# ---------------------------------------------------------
+# LAZY SHARED SINGLETONS
+# ---------------------------------------------------------
+def shared(factory):
+    """Wrap `factory` so it runs once, on first use, and every caller
+    gets the same instance afterwards (thread-safe)."""
+    lock = threading.Lock()
+    instance = []
+
+    @functools.wraps(factory)
+    def get():
+        if not instance:
+            with lock:
+                if not instance:
+                    instance.append(factory())
+        return instance[0]
+
+    return get
+
+
+get_engine = shared(get_sql_engine)
+
+
+@contextmanager
+def connect():
+    """get_engine().connect(), recording how long the pool checkout took."""
+    engine = get_engine()
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        pool_metrics.record_wait(time.perf_counter() - start)
+        yield conn
+
+
+@contextmanager
+def begin():
+    """get_engine().begin() (commit on success), with checkout timing."""
+    engine = get_engine()
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        pool_metrics.record_wait(time.perf_counter() - start)
+        yield conn
+
+
+def stream_rows(sql, params=None, batch_size=STREAM_BATCH_SIZE):
+    """Yield the rows of a large query through a server-side cursor,
+    `batch_size` rows per fetch, instead of materialising fetchall()."""
+    with connect() as conn:
+        result = conn.execution_options(yield_per=batch_size).execute(sql, params or {})
+        yield from result
+
+
+# ---------------------------------------------------------
+# COMPARISON TABLE UPSERT (#temp table + MERGE)
+#   used by both Compariosn_JsonToDB_loader.py scripts
+# ---------------------------------------------------------
+# A match is identified by GG item + competitor item + catalog
+MATCH_KEY_COLUMNS = ["gate_item_row_id", "competitor_item_id", "competitor_catalog_name"]
+
+# The catalog name can be missing. The comparison tables carry a persisted
+# ISNULL(competitor_catalog_name, '') column under their unique match index
+# (see ddl/comparison_upsert_keys.sql), and the MERGE joins on it so the
+# lookup stays an index seek and a NULL catalog still matches itself.
+CATALOG_KEY_COLUMN = "competitor_catalog_key"
+
+# SQL Server allows at most 2100 parameters per statement
+MAX_PARAMS = 2099
+
+
+def match_key(row):
+    """The MERGE identity of a row (NULL catalog == empty catalog)."""
+    gate_id, comp_id, catalog = (row[c] for c in MATCH_KEY_COLUMNS)
+    return gate_id, comp_id, "" if catalog is None else catalog
+
+
+def dedupe_rows(rows):
+    """Keep the last row per key (MERGE rejects duplicate source keys)."""
+    by_key = {}
+    for row in rows:
+        by_key[match_key(row)] = row
+    return list(by_key.values())
+
+
+def stage_rows(conn, table, columns, rows, stage="#stage"):
+    """Bulk-load rows into a temp table shaped like `table`'s `columns`,
+    with multi-row VALUES inserts."""
+    conn.execute(text(
+        f"SELECT TOP 0 {', '.join(columns)} INTO {stage} FROM {table}"
+    ))
+
+    per_insert = MAX_PARAMS // len(columns)
+    for start in range(0, len(rows), per_insert):
+        chunk = rows[start:start + per_insert]
+        values = ", ".join(
+            "(" + ", ".join(f":{col}_{i}" for col in columns) + ")"
+            for i in range(len(chunk))
+        )
+        params = {f"{col}_{i}": row[col] for i, row in enumerate(chunk) for col in columns}
+        conn.execute(text(f"INSERT INTO {stage} ({', '.join(columns)}) VALUES {values}"), params)
+
+
+def merge_sql(table, columns):
+    on = (
+        "t.gate_item_row_id = s.gate_item_row_id "
+        "AND t.competitor_item_id = s.competitor_item_id "
+        f"AND t.{CATALOG_KEY_COLUMN} = ISNULL(s.competitor_catalog_name, '')"
+    )
+    values = [c for c in columns if c not in MATCH_KEY_COLUMNS]
+
+    return text(f"""
+MERGE {table} AS t
+USING #stage AS s
+    ON {on}
+WHEN MATCHED AND EXISTS (
+    SELECT {', '.join(f"s.{c}" for c in values)}
+    EXCEPT
+    SELECT {', '.join(f"t.{c}" for c in values)}
+) THEN
+    UPDATE SET {', '.join(f"{c} = s.{c}" for c in values)}
+WHEN NOT MATCHED BY TARGET THEN
+    INSERT ({', '.join(columns)})
+    VALUES ({', '.join(f"s.{c}" for c in columns)})
+OUTPUT $action;
+""")
+
+
+def merge_rows(conn, table, columns, rows):
+    """MERGE rows into `table`; only new or changed rows are written.
+
+    Returns (inserted, updated).
+    """
+    rows = dedupe_rows(rows)
+    if not rows:
+        return 0, 0
+
+    stage_rows(conn, table, columns, rows)
+    actions = [r[0] for r in conn.execute(merge_sql(table, columns)).fetchall()]
+    conn.execute(text("DROP TABLE #stage"))
+
+    return actions.count("INSERT"), actions.count("UPDATE")
+
+
+def delete_keys(conn, table, keys):
+    """Delete the rows whose match_key() is in `keys`. Returns the count."""
+    keys = set(keys)
+    if not keys:
+        return 0
+
+    key_columns = MATCH_KEY_COLUMNS[:-1] + [CATALOG_KEY_COLUMN]
+    stage_rows(conn, table, key_columns,
+               [dict(zip(key_columns, key)) for key in keys], stage="#retract")
+    deleted = conn.execute(text(f"""
+DELETE t FROM {table} AS t
+JOIN #retract AS r
+    ON t.gate_item_row_id = r.gate_item_row_id
+    AND t.competitor_item_id = r.competitor_item_id
+    AND t.{CATALOG_KEY_COLUMN} = r.{CATALOG_KEY_COLUMN}
+""")).rowcount
+    conn.execute(text("DROP TABLE #retract"))
+
+    return deleted
@@ -0,0 +1,63 @@
+# build_offline_fixture.py
+#
+# Copies a sample of the Azure SQL tables the pipelines read into a local
+# SQLite file. Point OFFLINE_SQLITE at it to run the loaders without
+# network access:
+#
+#   python test_scripts/build_offline_fixture.py offline_fixture.sqlite 500
+#   OFFLINE_SQLITE=offline_fixture.sqlite python -m itemMappingAzure.main
+
+import os
+import sys
+import decimal
+import sqlite3
+from sqlalchemy import create_engine, text
+from dotenv import load_dotenv
+
+load_dotenv()
+
+server = os.getenv("AZURE_SQL_SERVER")
+database = os.getenv("AZURE_SQL_DATABASE")
+username = os.getenv("AZURE_SQL_USERNAME")
+password = os.getenv("AZURE_SQL_PASSWORD")
+
+connection_string = f"mssql+pymssql://{username}:{password}@{server}/{database}"
+
+TABLES = ["item", "item_price", "competitor_item_details"]
+
+
+def to_sqlite(value):
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if hasattr(value, "isoformat"):
+        return value.isoformat(sep=" ") if hasattr(value, "hour") else value.isoformat()
+    return value
+
+
+def copy_table(conn, out, table, limit):
+    result = conn.execute(text(f"SELECT TOP {int(limit)} * FROM dbo.{table}"))
+    columns = list(result.keys())
+    rows = [tuple(to_sqlite(v) for v in row) for row in result]
+
+    out.execute(f"DROP TABLE IF EXISTS {table}")
+    out.execute(f"CREATE TABLE {table} ({', '.join(columns)})")
+    out.executemany(
+        f"INSERT INTO {table} VALUES ({', '.join('?' for _ in columns)})", rows
+    )
+    print(f"✔ {table}: {len(rows)} rows")
+
+
+if __name__ == "__main__":
+    path = sys.argv[1] if len(sys.argv) > 1 else "offline_fixture.sqlite"
+    limit = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+
+    engine = create_engine(connection_string)
+    out = sqlite3.connect(path)
+
+    with engine.connect() as conn:
+        for table in TABLES:
+            copy_table(conn, out, table, limit)
+
+    out.commit()
+    out.close()
+    print(f"💾 Saved → {path}")
@@ -0,0 +1,65 @@
+# import_budget.py
+#
+# Measures the import cost of the pipeline modules (python -X importtime)
+# and fails when one exceeds the budget. Importing must not open SQL
+# connections, build API clients or load models; those happen on first use.
+#
+#   python test_scripts/import_budget.py            (budget from IMPORT_BUDGET_MS)
+
+import os
+import sys
+import subprocess
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BUDGET_MS = float(os.getenv("IMPORT_BUDGET_MS", "1500"))
+
+# (module, directory that has to be on sys.path)
+MODULES = [
+    ("itemMappingAzure.db_loader", ROOT),
+    ("itemMappingAzure.azureEmbedder", ROOT),
+    ("itemMappingAzure.freeMatcher", ROOT),
+    ("itemMapping.db_loader", os.path.join(ROOT, "Mapping(fittz+transformers)all files")),
+    ("itemMapping.azureEmbedder", os.path.join(ROOT, "Mapping(fittz+transformers)all files")),
+    ("itemMapping.embedder", os.path.join(ROOT, "Mapping(fittz+transformers)all files")),
+    ("itemMapping.freeEmbedder", os.path.join(ROOT, "Mapping(fittz+transformers)all files")),
+    ("db_loader", os.path.join(ROOT, "llm_item_matching")),
+    ("llm_client", os.path.join(ROOT, "llm_item_matching")),
+    ("llm_matcher", os.path.join(ROOT, "llm_item_matching")),
+]
+
+
+def import_ms(module, path):
+    """Cumulative import time of `module` in a fresh interpreter, in ms."""
+    env = dict(os.environ, PYTHONPATH=path)
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=path, env=env, capture_output=True, text=True
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(proc.stderr.strip().splitlines()[-1])
+
+    # Lines look like: "import time:  self [us] | cumulative | imported package"
+    for line in proc.stderr.splitlines():
+        parts = [p.strip() for p in line.split("|")]
+        if len(parts) == 3 and parts[2] == module:
+            return int(parts[1]) / 1000
+    return 0.0
+
+
+if __name__ == "__main__":
+    failed = False
+
+    print(f"Import budget: {BUDGET_MS:.0f} ms per module\n")
+    for module, path in MODULES:
+        try:
+            ms = import_ms(module, path)
+        except RuntimeError as e:
+            print(f"❌ {module:<34} import failed: {e}")
+            failed = True
+            continue
+
+        ok = ms <= BUDGET_MS
+        failed |= not ok
+        print(f"{'✅' if ok else '❌'} {module:<34} {ms:8.1f} ms")
+
+    sys.exit(1 if failed else 0)
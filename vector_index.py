@@ -0,0 +1,228 @@
+# vector_index.py
+#
+# Top-k vector indexes shared by itemMappingAzure and itemMapping.
+
+import logging
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # optional local library
+    hnswlib = None
+
+logger = logging.getLogger("pipeline")
+
+
+# ---------------------------------------------------------
+# HELPERS
+# ---------------------------------------------------------
+def as_matrix(vectors):
+    """Return vectors as a contiguous float32 (n, dim) matrix."""
+    return np.ascontiguousarray(np.asarray(vectors, dtype=np.float32))
+
+
+def top_k(scores, k):
+    """Return (scores, ids) of the k best columns per row, best first."""
+    k = min(k, scores.shape[1])
+    if k == 0:
+        empty = np.empty((scores.shape[0], 0))
+        return empty.astype(np.float32), empty.astype(np.int64)
+
+    ids = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+    part = np.take_along_axis(scores, ids, axis=1)
+    order = np.argsort(-part, axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1), np.take_along_axis(ids, order, axis=1)
+
+
+def pad(scores, ids, k):
+    """Pad results with id -1 when fewer than k vectors are indexed."""
+    missing = k - ids.shape[1]
+    if missing <= 0:
+        return scores, ids
+    n = ids.shape[0]
+    scores = np.hstack([scores, np.full((n, missing), -np.inf, dtype=np.float32)])
+    ids = np.hstack([ids, np.full((n, missing), -1, dtype=np.int64)])
+    return scores, ids
+
+
+# ---------------------------------------------------------
+# EXACT FLAT INDEX
+# ---------------------------------------------------------
+class FlatIndex:
+    """Exact inner-product search (vectors are already normalized)."""
+
+    def __init__(self, batch_size=1024):
+        self.batch_size = batch_size
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def add(self, vectors):
+        self.vectors = as_matrix(vectors)
+        return self
+
+    def search(self, queries, k):
+        queries = as_matrix(queries)
+        if not len(self.vectors) or not len(queries):
+            return pad(np.empty((len(queries), 0), np.float32),
+                       np.empty((len(queries), 0), np.int64), k)
+
+        all_scores, all_ids = [], []
+        for start in range(0, len(queries), self.batch_size):
+            scores = queries[start:start + self.batch_size] @ self.vectors.T
+            s, i = top_k(scores, k)
+            all_scores.append(s)
+            all_ids.append(i)
+
+        return pad(np.vstack(all_scores), np.vstack(all_ids), k)
+
+
+# ---------------------------------------------------------
+# APPROXIMATE IVF INDEX (pure NumPy)
+# ---------------------------------------------------------
+class IVFIndex:
+    """Inverted-file index: spherical k-means lists, probe the closest few."""
+
+    def __init__(self, n_lists=None, n_probe=8, n_iter=10, seed=0):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.n_iter = n_iter
+        self.seed = seed
+        self.vectors = np.zeros((0, 0), dtype=np.float32)
+        self.centroids = np.zeros((0, 0), dtype=np.float32)
+        self.lists = []
+
+    def __len__(self):
+        return len(self.vectors)
+
+    def train(self, vectors):
+        n = len(vectors)
+        n_lists = self.n_lists or max(1, int(np.sqrt(n)))
+        n_lists = min(n_lists, n)
+
+        rng = np.random.default_rng(self.seed)
+        centroids = vectors[rng.choice(n, n_lists, replace=False)].copy()
+
+        for _ in range(self.n_iter):
+            assign = np.argmax(vectors @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = vectors[assign == c]
+                if len(members):
+                    centroid = members.sum(axis=0)
+                    norm = np.linalg.norm(centroid)
+                    centroids[c] = centroid / norm if norm else centroid
+
+        self.centroids = centroids
+        return assign
+
+    def add(self, vectors):
+        self.vectors = as_matrix(vectors)
+        if not len(self.vectors):
+            self.lists = []
+            return self
+
+        assign = self.train(self.vectors)
+        self.lists = [np.flatnonzero(assign == c) for c in range(len(self.centroids))]
+        logger.info(
+            f"[INDEX] IVF built: {len(self.vectors)} vectors in {len(self.lists)} lists"
+        )
+        return self
+
+    def search(self, queries, k):
+        queries = as_matrix(queries)
+        scores_out = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        ids_out = np.full((len(queries), k), -1, dtype=np.int64)
+        if not len(self.vectors) or not len(queries):
+            return scores_out, ids_out
+
+        n_probe = min(self.n_probe, len(self.centroids))
+        _, probes = top_k(queries @ self.centroids.T, n_probe)
+
+        for qi, probe in enumerate(probes):
+            cand = np.concatenate([self.lists[c] for c in probe])
+            if not len(cand):
+                continue
+            s, i = top_k((self.vectors[cand] @ queries[qi])[None, :], k)
+            scores_out[qi, :s.shape[1]] = s[0]
+            ids_out[qi, :i.shape[1]] = cand[i[0]]
+
+        return scores_out, ids_out
+
+
+# ---------------------------------------------------------
+# APPROXIMATE HNSW INDEX (optional hnswlib)
+# ---------------------------------------------------------
+class HNSWIndex:
+    """HNSW graph index backed by hnswlib, if it is installed."""
+
+    def __init__(self, m=16, ef_construction=200, ef_search=100):
+        if hnswlib is None:
+            raise ImportError("hnswlib is not installed; use the 'flat' or 'ivf' index")
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.index = None
+        self.size = 0
+
+    def __len__(self):
+        return self.size
+
+    def add(self, vectors):
+        vectors = as_matrix(vectors)
+        self.size = len(vectors)
+        if not self.size:
+            return self
+
+        self.index = hnswlib.Index(space="ip", dim=vectors.shape[1])
+        self.index.init_index(
+            max_elements=self.size, ef_construction=self.ef_construction, M=self.m
+        )
+        self.index.add_items(vectors, np.arange(self.size))
+        return self
+
+    def search(self, queries, k):
+        queries = as_matrix(queries)
+        kk = min(k, self.size)
+        if not kk or not len(queries):
+            return pad(np.empty((len(queries), 0), np.float32),
+                       np.empty((len(queries), 0), np.int64), k)
+
+        self.index.set_ef(max(self.ef_search, kk))
+        ids, dists = self.index.knn_query(queries, k=kk)
+        # hnswlib "ip" distance is 1 - inner product
+        return pad((1.0 - dists).astype(np.float32), ids.astype(np.int64), k)
+
+
+# ---------------------------------------------------------
+# FACTORY + EVALUATION
+# ---------------------------------------------------------
+INDEX_TYPES = {
+    # "all" (MATCH_INDEX_TYPE default in itemMappingAzure) = exact search;
+    # freeMatcher scores every pair without building an index at all
+    "all": FlatIndex,
+    "flat": FlatIndex,
+    "ivf": IVFIndex,
+    "hnsw": HNSWIndex,
+}
+
+
+def build_index(kind, vectors, **kwargs):
+    """Build a vector index of the given kind ('all'/'flat', 'ivf' or 'hnsw')."""
+    if kind not in INDEX_TYPES:
+        raise ValueError(f"Unknown index type '{kind}', expected one of {list(INDEX_TYPES)}")
+    return INDEX_TYPES[kind](**kwargs).add(vectors)
+
+
+def recall_at_k(index, vectors, queries, k):
+    """Fraction of the exact top-k neighbours that the index also returns."""
+    _, exact_ids = FlatIndex().add(vectors).search(queries, k)
+    _, approx_ids = index.search(queries, k)
+
+    found = total = 0
+    for exact, approx in zip(exact_ids, approx_ids):
+        exact = set(exact[exact >= 0].tolist())
+        found += len(exact & set(approx.tolist()))
+        total += len(exact)
+
+    return found / total if total else 1.0